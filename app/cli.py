@@ -0,0 +1,68 @@
+"""wblog management commands
+
+python -m app init-db
+python -m app count-comments
+"""
+
+import argparse
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import database, models
+from .crud import refresh_article_snapshots
+
+
+def init_db(engine):
+    """create or upgrade the schema, seed the owner and record the version"""
+    with engine.begin() as connection:
+        version = database.get_schema_version(connection)
+        database.Base.metadata.create_all(connection)
+        added_columns = database.add_missing_columns(connection)
+        models.create_search_index(models.Article.__table__, connection)
+        database.create_missing_indexes(connection)
+        if {("tag", "article_count"), ("category", "article_count")} & added_columns:
+            models.count_articles(connection)
+        if ("article", "comment_count") in added_columns:
+            models.count_comments(connection)
+        if ("comment", "update_time") in added_columns:
+            comment = models.Comment.__table__
+            connection.execute(
+                update(comment).values(update_time=comment.c.create_time)
+            )
+        models.create_owner_data(connection)
+        # an upgrade may change what the snapshots hold, re-encode them all
+        stale = []
+        if version == database.schema_version:
+            stale.append(models.Article.snapshot.is_(None))
+        refresh_article_snapshots(Session(connection), *stale)
+        database.set_schema_version(connection)
+
+
+def count_comments(engine):
+    """repair the comment_count of every article, returning how many were wrong"""
+    with engine.begin() as connection:
+        article_ids = models.count_comments(connection)
+        if article_ids:
+            refresh_article_snapshots(
+                Session(connection), models.Article.id.in_(article_ids)
+            )
+    return len(article_ids)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="wblog", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "init-db", help="create or upgrade the database and seed the owner"
+    )
+    commands.add_parser(
+        "count-comments", help="recompute the comment count of every article"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "init-db":
+        init_db(database.engine)
+        print(f"database schema is at version {database.schema_version}")
+    elif args.command == "count-comments":
+        print(f"fixed the comment count of {count_comments(database.engine)} articles")
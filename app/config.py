@@ -24,5 +24,52 @@ class Settings(BaseSettings):
     db_port: int | None = Field(None, ge=0, le=65535)
     db_database: str = Field("wblog.db", min_length=1)
     db_query: DBQuerySettings = DBQuerySettings()
+    # connection pool, ignored by the in-memory sqlite database
+    db_pool_size: int = Field(10, ge=1)
+    db_max_overflow: int = Field(20, ge=0)
+    db_pool_timeout: float = Field(10, gt=0)
+    db_pool_recycle: int = Field(1800, ge=-1)
+    db_pool_pre_ping: bool = True
+    # GET requests read from these, a replica failing to connect is skipped for
+    # db_replica_cooldown seconds. after a write the client reads from the
+    # primary for db_read_your_writes seconds
+    db_replica_urls: list[str] = []
+    db_replica_cooldown: float = Field(30, ge=0)
+    db_read_your_writes: int = Field(5, ge=0)
+    # pragmas run on every new sqlite connection, WAL lets readers work
+    # alongside a writer and busy_timeout makes writers wait for the lock
+    db_sqlite_journal_mode: str = Field(
+        "WAL", pattern="^(?i:delete|truncate|persist|memory|wal|off)$"
+    )
+    db_sqlite_synchronous: str = Field("NORMAL", pattern="^(?i:off|normal|full|extra)$")
+    db_sqlite_busy_timeout: int = Field(5000, ge=0)
+    db_sqlite_mmap_size: int = Field(256 * 1024 * 1024, ge=0)
+    db_sqlite_cache_size: int = -64 * 1024
+
+    password_hash_workers: int = Field(2, ge=1)
+    password_hash_queue_limit: int = Field(16, ge=0)
+
+    article_import_chunk_size: int = Field(500, ge=1)
+    export_batch_size: int = Field(500, ge=1)
+
+    count_cache_size: int = Field(1024, ge=0)
+    count_cache_ttl: float = Field(30, ge=0)
+    member_cache_size: int = Field(1024, ge=0)
+    member_cache_ttl: float = Field(30, ge=0)
+    # per process, only correct when a single worker writes the database
+    article_bitmap_index: bool = False
+    article_bitmap_max_candidates: int = Field(10000, ge=1)
+
+    # encode v1 responses in one pass through their response_model with
+    # orjson for the rest, instead of fastapi's validate and jsonable_encoder
+    fast_json_response: bool = True
+
+    metrics_enabled: bool = False
+    server_timing: bool = True
+    # log requests running more statements than this, 0 disables it
+    sql_query_budget: int = Field(0, ge=0)
+
+    # 0 writes every like/dislike at once, otherwise they are batched
+    comment_vote_flush_ms: int = Field(0, ge=0)
 
     model_config = SettingsConfigDict(env_file=".env", env_nested_delimiter="__")
@@ -1,3 +1,5 @@
+from .cache import *
+from .snapshot import *
 from .member import *
 from .category import *
 from .tag import *
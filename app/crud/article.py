@@ -1,31 +1,178 @@
+from collections import Counter, defaultdict
 from datetime import datetime
-from sqlalchemy import desc, func
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    and_,
+    delete,
+    desc,
+    func,
+    literal_column,
+    table,
+    column,
+    select,
+    insert,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, selectinload, undefer
 from sqlalchemy.exc import SQLAlchemyError
 
+from .. import database
 from .. import models
 from .. import schemas
+from .. import utils
+from ..utils import apply_order, fetch_page
+from .cache import article_bitmap_index, article_count_cache, comment_count_cache
+from .snapshot import (
+    article_snapshot_query,
+    encode_article_snapshot,
+    refresh_article_snapshots,
+)
 from . import (
     get_tag,
-    get_tag_by_name,
-    create_tag,
-    get_category_by_name,
-    create_category,
+    resolve_tags,
+    resolve_categories,
+    add_tag_article_counts,
+    add_category_article_counts,
 )
 
 
-def get_article(db: Session, article_id: int):
-    return db.query(models.Article).filter(models.Article.id == article_id).first()
+async def get_article(db: AsyncSession, article_id: int):
+    # relationships are loaded here because lazy loading is not available
+    # once the result leaves the session
+    return await db.scalar(
+        select(models.Article)
+        .filter(models.Article.id == article_id)
+        .options(
+            undefer(models.Article.content),
+            joinedload(models.Article.writer),
+            joinedload(models.Article.category),
+            selectinload(models.Article.tags),
+        )
+        .execution_options(populate_existing=True)
+    )
+
+
+async def get_article_version(db: AsyncSession, article_id: int):
+    # what the detail response depends on, read without loading the content
+    row = (
+        await db.execute(
+            select(
+                models.Article.update_time,
+                models.Category.id,
+                models.Member.name,
+            )
+            .outerjoin(models.Category, models.Article.category)
+            .outerjoin(models.Member, models.Article.writer)
+            .filter(models.Article.id == article_id)
+        )
+    ).first()
+    if row is None:
+        return None
+    tag_ids = await db.scalars(
+        select(models.Tag.id)
+        .join(models.article2tag, models.article2tag.c.tag_id == models.Tag.id)
+        .filter(models.article2tag.c.article_id == article_id)
+        .order_by(models.Tag.id)
+    )
+    return (*row, tuple(tag_ids.all()))
 
 
-def get_article_by_title(db: Session, article_title: str):
-    return (
-        db.query(models.Article).filter(models.Article.title == article_title).first()
+async def get_article_by_title(db: AsyncSession, article_title: str):
+    return await db.scalar(
+        select(models.Article).filter(models.Article.title == article_title)
     )
 
 
-def list_articles(
-    db: Session,
+article_fts = table("article_fts", column("rowid"), column("rank"))
+
+
+def _fts5_query(search: str):
+    # quote every term so user input is never parsed as fts5 syntax
+    terms = ['"' + term.replace('"', '""') + '"' for term in search.split()]
+    return " ".join(terms)
+
+
+def search_articles(db: AsyncSession, query, search: str):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return (
+            query.join(article_fts, article_fts.c.rowid == models.Article.id)
+            .filter(literal_column("article_fts").op("MATCH")(_fts5_query(search)))
+            .order_by(article_fts.c.rank)
+        )
+    if dialect == "postgresql":
+        search_vector = literal_column("article.search_vector")
+        ts_query = func.plainto_tsquery("simple", search)
+        return query.filter(search_vector.op("@@")(ts_query)).order_by(
+            desc(func.ts_rank(search_vector, ts_query))
+        )
+    # no native full-text index, fall back to matching terms one by one
+    for term in search.split():
+        query = query.filter(
+            models.Article.title.like(f"%{term}%")
+            | models.Article.content.like(f"%{term}%")
+        )
+    return query
+
+
+def content_has_terms(db: AsyncSession, terms: str):
+    """filter on the articles whose content holds every term, answered by the
+    full-text index, terms match whole words rather than substrings
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # scoped to the content column so title words do not match
+        return models.Article.id.in_(
+            select(article_fts.c.rowid).filter(
+                literal_column("article_fts").op("MATCH")(
+                    f"content : ({_fts5_query(terms)})"
+                )
+            )
+        )
+    if dialect == "postgresql":
+        # the index narrows the rows on title and content, the second
+        # condition keeps the ones matching on content alone
+        ts_query = func.plainto_tsquery("simple", terms)
+        search_vector = literal_column("article.search_vector")
+        content_vector = func.to_tsvector("simple", models.Article.content)
+        return search_vector.op("@@")(ts_query) & content_vector.op("@@")(ts_query)
+    # no native full-text index, fall back to matching terms one by one
+    return and_(*(models.Article.content.like(f"%{term}%") for term in terms.split()))
+
+
+async def load_article_bitmap_index(db: AsyncSession):
+    version = article_bitmap_index.version
+    articles = await db.execute(
+        select(
+            models.Article.id, models.Article.category_id, models.Article.is_deleted
+        )
+    )
+    links = await db.execute(
+        select(models.article2tag.c.article_id, models.article2tag.c.tag_id)
+    )
+    return article_bitmap_index.load(articles, links, version)
+
+
+async def match_tagged_articles(
+    db: AsyncSession, tag_ids: list[int], category_id: int, is_deleted: bool
+):
+    """ids of the articles with all the tags according to the bitmap index,
+    or None when the sql filters have to be used instead
+    """
+    if not article_bitmap_index.enabled:
+        return None
+    if not article_bitmap_index.loaded:
+        # a replica may lag behind, the index would keep its state for good
+        if database.is_replica(db) or not await load_article_bitmap_index(db):
+            return None
+    article_ids = article_bitmap_index.match(tag_ids, category_id, is_deleted)
+    if len(article_ids) > article_bitmap_index.max_candidates:
+        return None
+    return list(article_ids)
+
+
+async def list_articles(
+    db: AsyncSession,
     title_like: str = None,
     content_has: str = None,
     category_id: int = None,
@@ -39,22 +186,33 @@ def list_articles(
     order_by: str = "-create_time",
     skip: int = 0,
     limit: int = 10,
+    q: str = None,
+    after: tuple = None,
+    with_total: bool = True,
 ):
     params = []
+    candidate_ids = None
+    if tag_ids is not None:
+        candidate_ids = await match_tagged_articles(
+            db, tag_ids, category_id, is_deleted
+        )
     if title_like is not None:
         params.append(models.Article.title.like(f"%{title_like}%"))
-    if content_has is not None:
-        params.append(models.Article.content.like(f"%{content_has}%"))
-    if category_id is not None:
-        params.append(models.Article.category_id == category_id)
-    if tag_ids is not None:
+    if content_has is not None and content_has.split():
+        params.append(content_has_terms(db, content_has))
+    if candidate_ids is not None:
+        # the bitmaps already applied the tag, category and is_deleted filters
+        params.append(models.Article.id.in_(candidate_ids))
+    elif tag_ids is not None:
         article_ids_with_all_tags = (
-            db.query(models.article2tag.c.article_id)
+            select(models.article2tag.c.article_id)
             .filter(models.article2tag.c.tag_id.in_(tag_ids))
             .group_by(models.article2tag.c.article_id)
             .having(func.count(models.article2tag.c.tag_id) == len(tag_ids))
         )
         params.append(models.Article.id.in_(article_ids_with_all_tags))
+    if category_id is not None and candidate_ids is None:
+        params.append(models.Article.category_id == category_id)
     if writer_id is not None:
         params.append(models.Article.writer_id == writer_id)
     if create_time_after is not None:
@@ -65,138 +223,355 @@ def list_articles(
         params.append(models.Article.update_time > update_time_after)
     if update_time_before is not None:
         params.append(models.Article.update_time < update_time_after)
-    if is_deleted is not None:
+    if is_deleted is not None and candidate_ids is None:
         params.append(models.Article.is_deleted == is_deleted)
 
-    query = db.query(models.Article).filter(*params)
+    query = select(models.Article).filter(*params)
 
-    if order_by is not None:
-        if order_by.startswith("-"):
-            order_by = order_by[1:]
-            query = query.order_by(desc(order_by))
-        else:
-            query = query.order_by(order_by)
+    if q is not None and q.split():
+        # relevance first, order_by only breaks ties
+        query = search_articles(db, query, q)
 
-    return query.offset(skip).limit(limit).all(), query.count()
+    # the stored snapshots and the cursor columns, rows are served as
+    # pre-encoded json by get_article_snapshots
+    page = apply_order(query, models.Article, order_by, after).options(
+        load_only(
+            models.Article.id,
+            models.Article.title,
+            models.Article.create_time,
+            models.Article.update_time,
+            models.Article.comment_count,
+            models.Article.snapshot,
+        )
+    )
+    # the total ignores the cursor, it counts every row matching the filters
+    count_key = (
+        title_like,
+        content_has,
+        category_id,
+        None if tag_ids is None else tuple(sorted(tag_ids)),
+        writer_id,
+        create_time_after,
+        create_time_before,
+        update_time_after,
+        update_time_before,
+        is_deleted,
+        q,
+    )
+    return await fetch_page(
+        db,
+        page.offset(skip).limit(limit),
+        query,
+        with_total,
+        article_count_cache,
+        count_key,
+        windowed=after is None,
+    )
 
 
-def create_article(db: Session, writer_id: int, article: schemas.ArticleCreate):
-    try:
-        db_article = models.Article(
-            **article.model_dump(exclude=["tags", "category"]), writer_id=writer_id
+async def get_article_snapshots(db: AsyncSession, articles: list[models.Article]):
+    """the ArticleSimplify json of every article, encoding on the fly the
+    rows written before their snapshot was stored
+    """
+    snapshots = [article.snapshot for article in articles]
+    missing = [article.id for article in articles if article.snapshot is None]
+    if missing:
+        rows = await db.scalars(
+            article_snapshot_query(models.Article.id.in_(missing)).execution_options(
+                populate_existing=True
+            )
         )
+        encoded = {article.id: encode_article_snapshot(article) for article in rows}
+        snapshots = [
+            encoded[article.id] if snapshot is None else snapshot
+            for article, snapshot in zip(articles, snapshots)
+        ]
+    return snapshots
 
-        for tag_name in article.tags:
-            tag = get_tag_by_name(db, tag_name)
-            if tag is None:
-                tag = create_tag(db, schemas.TagCreate(name=tag_name))
-                db.add(tag)
-            db_article.tags.append(tag)
 
-        if article.category is not None:
-            category = get_category_by_name(db, article.category)
-            if category is None:
-                category = create_category(
-                    db, schemas.CategoryCreate(name=article.category)
-                )
-                db.add(category)
-            db_article.category = category
+async def stream_articles(
+    db: AsyncSession, updated_since: datetime = None, batch_size: int = 500
+):
+    """yield batches of article rows in id order from a server-side cursor,
+    with the category name and tag names of every article
+    """
+    query = (
+        select(
+            models.Article.id,
+            models.Article.title,
+            models.Article.content,
+            models.Article.create_time,
+            models.Article.update_time,
+            models.Article.is_deleted,
+            models.Article.writer_id,
+            models.Category.name.label("category"),
+        )
+        .outerjoin(models.Article.category)
+        .order_by(models.Article.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if updated_since is not None:
+        query = query.filter(models.Article.update_time >= updated_since)
+
+    result = await db.stream(query)
+    async for rows in result.partitions():
+        tags = defaultdict(list)
+        tag_rows = await db.execute(
+            select(models.article2tag.c.article_id, models.Tag.name)
+            .join(models.Tag, models.Tag.id == models.article2tag.c.tag_id)
+            .filter(models.article2tag.c.article_id.in_([row.id for row in rows]))
+        )
+        for article_id, tag_name in tag_rows:
+            tags[article_id].append(tag_name)
+        yield [{**row._mapping, "tags": tags[row.id]} for row in rows]
 
+
+async def create_article(
+    db: AsyncSession, writer_id: int, article: schemas.ArticleCreate
+):
+    try:
+        tag_ids = await resolve_tags(db, article.tags)
+        category_ids = await resolve_categories(
+            db, [article.category] if article.category is not None else []
+        )
+        db_article = models.Article(
+            **article.model_dump(exclude=["tags", "category"]),
+            writer_id=writer_id,
+            category_id=category_ids.get(article.category),
+        )
         db.add(db_article)
-        db.commit()
+        await db.flush()
+        if tag_ids:
+            await db.execute(
+                insert(models.article2tag),
+                [
+                    {"article_id": db_article.id, "tag_id": tag_id}
+                    for tag_id in tag_ids.values()
+                ],
+            )
+        await add_tag_article_counts(db, dict.fromkeys(tag_ids.values(), 1))
+        await add_category_article_counts(db, {db_article.category_id: 1})
+        await db.run_sync(
+            refresh_article_snapshots, models.Article.id == db_article.id
+        )
+        await db.commit()
+        article_count_cache.clear()
+        article_bitmap_index.add_article(
+            db_article.id, db_article.category_id, False, tag_ids.values()
+        )
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return None
-    db.refresh(db_article)
-    return db_article
+    return await get_article(db, db_article.id)
+
+
+async def bulk_create_articles(
+    db: AsyncSession, writer_id: int, articles: list[schemas.ArticleCreate]
+):
+    """create articles in one transaction with set-based tag and category
+    resolution, returning the new id or an error message for every article
+    """
+    results: list[int | str] = [None] * len(articles)
+    titles = [article.title for article in articles]
+    existing_titles = set(
+        await db.scalars(
+            select(models.Article.title).filter(models.Article.title.in_(titles))
+        )
+    )
+    to_create = {}
+    for i, article in enumerate(articles):
+        if article.title in existing_titles or article.title in to_create:
+            results[i] = "article title already exist"
+        else:
+            to_create[article.title] = i
+    if not to_create:
+        return results
+
+    try:
+        creating = [articles[i] for i in to_create.values()]
+        tag_ids = await resolve_tags(
+            db, [tag for article in creating for tag in article.tags]
+        )
+        category_ids = await resolve_categories(
+            db, [article.category for article in creating if article.category]
+        )
+        values = [
+            {
+                **article.model_dump(exclude=["tags", "category"]),
+                "writer_id": writer_id,
+                "category_id": category_ids.get(article.category),
+            }
+            for article in creating
+        ]
+        if db.get_bind().dialect.insert_executemany_returning:
+            rows = await db.execute(
+                insert(models.Article).returning(
+                    models.Article.id, models.Article.title
+                ),
+                values,
+            )
+        else:
+            # mysql can not return rows from a multi-row insert, titles are
+            # unique so the new ids are read back by title
+            await db.execute(insert(models.Article), values)
+            rows = await db.execute(
+                select(models.Article.id, models.Article.title).filter(
+                    models.Article.title.in_(to_create)
+                )
+            )
+        article_ids = dict((title, article_id) for article_id, title in rows)
+        links = {
+            (article_ids[article.title], tag_ids[tag])
+            for article in creating
+            for tag in article.tags
+        }
+        if links:
+            await db.execute(
+                insert(models.article2tag),
+                [{"article_id": a, "tag_id": t} for a, t in links],
+            )
+        await add_tag_article_counts(db, Counter(tag_id for _, tag_id in links))
+        await add_category_article_counts(
+            db, Counter(category_ids.get(article.category) for article in creating)
+        )
+        await db.run_sync(
+            refresh_article_snapshots, models.Article.id.in_(article_ids.values())
+        )
+        await db.commit()
+        article_count_cache.clear()
+        for article in creating:
+            article_bitmap_index.add_article(
+                article_ids[article.title],
+                category_ids.get(article.category),
+                False,
+                [tag_ids[tag] for tag in article.tags],
+            )
+    except SQLAlchemyError as e:
+        await db.rollback()
+        for i in to_create.values():
+            results[i] = "fail to create article"
+        return results
+
+    for title, i in to_create.items():
+        results[i] = article_ids[title]
+    return results
 
 
-def delete_article(db: Session, article_id: int):
+async def delete_article(db: AsyncSession, article_id: int):
     try:
-        # here will not use db.query().filter().delete()
+        # here will not use delete(models.Article).filter()
         # because of https://github.com/sqlalchemy/sqlalchemy/discussions/7974
-        article = get_article(db, article_id)
+        article = await get_article(db, article_id)
         if article is None:
             return True
-        db.delete(article)
-        db.commit()
+        tag_ids = [tag.id for tag in article.tags]
+        await add_tag_article_counts(db, dict.fromkeys(tag_ids, -1))
+        await add_category_article_counts(db, {article.category_id: -1})
+        await db.delete(article)
+        await db.commit()
+        article_count_cache.clear()
+        comment_count_cache.clear()
+        article_bitmap_index.remove_article(article_id, article.category_id, tag_ids)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def update_article(db: Session, article_id: int, article: schemas.ArticleUpdate):
+async def update_article(
+    db: AsyncSession, article_id: int, article: schemas.ArticleUpdate
+):
     try:
-        db.query(models.Article).filter(models.Article.id == article_id).update(
-            article.model_dump(exclude_unset=True)
+        await db.execute(
+            update(models.Article)
+            .filter(models.Article.id == article_id)
+            .values(article.model_dump(exclude_unset=True))
         )
-        db.commit()
+        await db.run_sync(refresh_article_snapshots, models.Article.id == article_id)
+        await db.commit()
+        article_count_cache.clear()
+        if article.is_deleted is not None:
+            article_bitmap_index.set_deleted(article_id, article.is_deleted)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def set_article_category(
-    db: Session, article_id: int, category: schemas.CategoryWithName
+async def set_article_category(
+    db: AsyncSession, article_id: int, category: schemas.CategoryWithName
 ):
     try:
-        article = get_article(db, article_id)
+        article = await get_article(db, article_id)
         if article is None:
             return True
-        result_category = get_category_by_name(db, category.name)
-        if result_category is None:
-            result_category = models.Category(**category.model_dump())
-            db.add(result_category)
-        article.category = result_category
-        db.commit()
+        category_ids = await resolve_categories(db, [category.name])
+        category_id = category_ids[category.name]
+        old_category_id = article.category_id
+        if old_category_id != category_id:
+            await add_category_article_counts(
+                db, {old_category_id: -1, category_id: 1}
+            )
+            article.category_id = category_id
+            await db.run_sync(
+                refresh_article_snapshots, models.Article.id == article_id
+            )
+        await db.commit()
+        article_count_cache.clear()
+        article_bitmap_index.set_category(article_id, old_category_id, category_id)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def add_article_tag(db: Session, article_id: int, tag: schemas.TagWithName):
+async def add_article_tag(db: AsyncSession, article_id: int, tag: schemas.TagWithName):
     try:
-        article: models.Article = get_article(db, article_id)
+        article: models.Article = await get_article(db, article_id)
         if article is None:
             return True
-        result_tag = get_tag_by_name(db, tag.name)
-        if result_tag is None:
-            result_tag = models.Tag(**tag.model_dump())
-            db.add(result_tag)
-
-        if (
-            db.query(models.article2tag)
-            .filter(
-                models.article2tag.c.article_id == article_id,
-                models.article2tag.c.tag_id == result_tag.id,
+        tag_ids = await resolve_tags(db, [tag.name])
+        result = await db.execute(
+            utils.insert_ignore(db.get_bind().dialect.name, models.article2tag),
+            {"article_id": article_id, "tag_id": tag_ids[tag.name]},
+        )
+        # the link may already exist, count only a row actually inserted
+        await add_tag_article_counts(db, {tag_ids[tag.name]: result.rowcount})
+        if result.rowcount:
+            await db.run_sync(
+                refresh_article_snapshots, models.Article.id == article_id
             )
-            .first()
-            is not None
-        ):
-            db.commit()
-            return True
-
-        article.tags.append(result_tag)
-        db.commit()
+        await db.commit()
+        article_count_cache.clear()
+        article_bitmap_index.add_tag(article_id, tag_ids[tag.name])
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def remove_article_tag(db: Session, article_id: int, tag_id: int):
-    article: models.Article = get_article(db, article_id)
-    tag: models.Tag = get_tag(db, tag_id)
+async def remove_article_tag(db: AsyncSession, article_id: int, tag_id: int):
+    article: models.Article = await get_article(db, article_id)
+    tag: models.Tag = await get_tag(db, tag_id)
     if article is None or tag is None:
         return True
 
     try:
-        article.tags.remove(tag)
-        db.commit()
+        result = await db.execute(
+            delete(models.article2tag).filter(
+                models.article2tag.c.article_id == article_id,
+                models.article2tag.c.tag_id == tag_id,
+            )
+        )
+        await add_tag_article_counts(db, {tag_id: -result.rowcount})
+        if result.rowcount:
+            await db.run_sync(
+                refresh_article_snapshots, models.Article.id == article_id
+            )
+        await db.commit()
+        article_count_cache.clear()
+        article_bitmap_index.remove_tag(article_id, tag_id)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
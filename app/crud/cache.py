@@ -0,0 +1,19 @@
+from ..dependencies import config
+from ..utils import ArticleBitmapIndex, TTLCache
+
+
+settings = config.get_settings()
+
+# totals of list queries keyed by their filters, cleared by every write that
+# could change them. other workers keep their own copy until it expires
+article_count_cache = TTLCache(settings.count_cache_size, settings.count_cache_ttl)
+comment_count_cache = TTLCache(settings.count_cache_size, settings.count_cache_ttl)
+
+# members of authenticated requests keyed by name, dropped by update_member
+member_cache = TTLCache(settings.member_cache_size, settings.member_cache_ttl)
+
+# tag, category and is_deleted bitmaps used by list_articles for tag filters,
+# updated after every committed write of this process
+article_bitmap_index = ArticleBitmapIndex(
+    settings.article_bitmap_index, settings.article_bitmap_max_candidates
+)
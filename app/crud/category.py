@@ -1,47 +1,100 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
 from .. import models
 from .. import schemas
+from .. import utils
+from .snapshot import refresh_article_snapshots
 
 
-def get_category(db: Session, category_id: int):
-    return db.query(models.Category).filter(models.Category.id == category_id).first()
+async def get_category(db: AsyncSession, category_id: int):
+    return await db.scalar(
+        select(models.Category).filter(models.Category.id == category_id)
+    )
+
+
+async def get_category_by_name(db: AsyncSession, category_name: str):
+    return await db.scalar(
+        select(models.Category).filter(models.Category.name == category_name)
+    )
 
 
-def get_category_by_name(db: Session, category_name: str):
-    return (
-        db.query(models.Category).filter(models.Category.name == category_name).first()
+async def resolve_categories(db: AsyncSession, category_names: list[str]):
+    """map names to category ids, upserting the missing ones, without committing"""
+    # missing names are inserted in the given order, keeping their ids stable
+    category_names = list(dict.fromkeys(category_names))
+    if not category_names:
+        return {}
+    query = select(models.Category.name, models.Category.id).filter(
+        models.Category.name.in_(category_names)
     )
+    category_ids = dict((await db.execute(query)).all())
+    missing = [name for name in category_names if name not in category_ids]
+    if missing:
+        await db.execute(
+            utils.insert_ignore(db.get_bind().dialect.name, models.Category),
+            [{"name": name} for name in missing],
+        )
+        category_ids = dict((await db.execute(query)).all())
+    return category_ids
 
 
-def list_categories(db: Session, hide_unused: bool = False):
+async def list_categories(
+    db: AsyncSession, hide_unused: bool = False, order_by: str = "id"
+):
     params = []
     if hide_unused:
-        category_ids = db.query(models.Article.category_id)
-        params.append(models.Category.id.in_(category_ids))
+        params.append(models.Category.article_count > 0)
+    query = utils.apply_order(
+        select(models.Category).filter(*params), models.Category, order_by
+    )
+    result = await db.scalars(query)
+    return result.all()
+
 
-    return db.query(models.Category).filter(*params).all()
+async def add_category_article_counts(db: AsyncSession, deltas: dict[int, int]):
+    """add article_count increments to many categories in one batched update,
+    without committing
+    """
+    category = models.Category.__table__
+    params = [
+        {"category_id": category_id, "delta": delta}
+        for category_id, delta in deltas.items()
+        if category_id is not None and delta != 0
+    ]
+    if not params:
+        return
+    await db.execute(
+        update(category)
+        .where(category.c.id == bindparam("category_id"))
+        .values(article_count=category.c.article_count + bindparam("delta")),
+        params,
+    )
 
 
-def create_category(db: Session, category: schemas.CategoryCreate):
+async def create_category(db: AsyncSession, category: schemas.CategoryCreate):
     try:
         db_category = models.Category(**category.model_dump())
         db.add(db_category)
-        db.commit()
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return None
-    db.refresh(db_category)
+    await db.refresh(db_category)
     return db_category
 
 
-def delete_category(db: Session, category_id: int):
+async def delete_category(db: AsyncSession, category_id: int):
     try:
-        db.query(models.Category).filter(models.Category.id == category_id).delete()
-        db.commit()
+        await db.execute(
+            delete(models.Category).filter(models.Category.id == category_id)
+        )
+        await db.run_sync(
+            refresh_article_snapshots, models.Article.category_id == category_id
+        )
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
-
@@ -1,24 +1,46 @@
+import asyncio
+import contextlib
+import logging
 from datetime import datetime
-from sqlalchemy import desc, func
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import SQLAlchemyError
 
 from .. import models
 from .. import schemas
+from ..utils import apply_order, fetch_page
+from .cache import comment_count_cache
+from .snapshot import refresh_article_snapshots
 from . import get_article
 
+logger = logging.getLogger(__name__)
 
-def get_comment(db: Session, comment_id: int):
-    return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+
+async def get_comment(db: AsyncSession, comment_id: int):
+    return await db.scalar(
+        select(models.Comment)
+        .filter(models.Comment.id == comment_id)
+        .options(
+            joinedload(models.Comment.member),
+            # writer_id is used by the permission checks of the routers
+            joinedload(models.Comment.article).load_only(
+                models.Article.id, models.Article.title, models.Article.writer_id
+            ),
+        )
+        .execution_options(populate_existing=True)
+    )
 
 
-def list_comments(
-    db: Session,
+async def list_comments(
+    db: AsyncSession,
     article_id: int = None,
     member_id: int = None,
     order_by: str = "-create_time",
     skip: int = 0,
     limit: int = 10,
+    after: tuple = None,
+    with_total: bool = True,
 ):
     params = []
     if article_id is not None:
@@ -26,18 +48,70 @@ def list_comments(
     if member_id is not None:
         params.append(models.Comment.member_id == member_id)
 
-    query = db.query(models.Comment).filter(*params)
-    if order_by is not None:
-        if order_by.startswith("-"):
-            order_by = order_by[1:]
-            query = query.order_by(desc(order_by))
-        else:
-            query = query.order_by(order_by)
-    return query.offset(skip).limit(limit).all(), query.count()
+    query = select(models.Comment).filter(*params)
+    page = apply_order(query, models.Comment, order_by, after).options(
+        joinedload(models.Comment.member),
+        joinedload(models.Comment.article).load_only(
+            models.Article.id, models.Article.title
+        ),
+    )
+    # the total ignores the cursor, it counts every row matching the filters
+    return await fetch_page(
+        db,
+        page.offset(skip).limit(limit),
+        query,
+        with_total,
+        comment_count_cache,
+        (article_id, member_id),
+        windowed=after is None,
+    )
 
 
-def create_comment(
-    db: Session, article_id: int, member_id: int, comment: schemas.CommentCreate
+async def stream_comments(
+    db: AsyncSession, updated_since: datetime = None, batch_size: int = 500
+):
+    """yield batches of comment rows in id order from a server-side cursor"""
+    query = (
+        select(
+            models.Comment.id,
+            models.Comment.content,
+            models.Comment.commenter_name,
+            models.Comment.like,
+            models.Comment.dislike,
+            models.Comment.create_time,
+            models.Comment.update_time,
+            models.Comment.article_id,
+            models.Comment.member_id,
+        )
+        .order_by(models.Comment.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if updated_since is not None:
+        query = query.filter(models.Comment.update_time >= updated_since)
+
+    result = await db.stream(query)
+    async for rows in result.partitions():
+        yield [row._mapping for row in rows]
+
+
+async def add_article_comment_count(db: AsyncSession, article_id: int, delta: int):
+    """shift the comment_count of an article in the database itself, so
+    concurrent writers never lose an update, without committing
+    """
+    article = models.Article.__table__
+    await db.execute(
+        update(article)
+        .where(article.c.id == article_id)
+        .values(
+            comment_count=article.c.comment_count + delta,
+            update_time=article.c.update_time,
+        )
+    )
+    await db.run_sync(refresh_article_snapshots, models.Article.id == article_id)
+
+
+async def create_comment(
+    db: AsyncSession, article_id: int, member_id: int, comment: schemas.CommentCreate
 ):
     try:
         db_comment = models.Comment(
@@ -46,57 +120,143 @@ def create_comment(
             member_id=member_id,
         )
         db.add(db_comment)
-        db.commit()
+        await add_article_comment_count(db, article_id, 1)
+        await db.commit()
+        comment_count_cache.clear()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return None
-    db.refresh(db_comment)
-    return db_comment
+    return await get_comment(db, db_comment.id)
 
 
-def delete_comment(db: Session, comment_id: int):
+async def delete_comment(db: AsyncSession, comment_id: int):
     try:
-        db.query(models.Comment).filter(models.Comment.id == comment_id).delete()
-        db.commit()
+        statement = delete(models.Comment).filter(models.Comment.id == comment_id)
+        if db.get_bind().dialect.delete_returning:
+            article_id = await db.scalar(
+                statement.returning(models.Comment.article_id)
+            )
+        else:
+            # mysql has no DELETE ... RETURNING, read the article first
+            article_id = await db.scalar(
+                select(models.Comment.article_id).filter(
+                    models.Comment.id == comment_id
+                )
+            )
+            result = await db.execute(statement)
+            if result.rowcount == 0:
+                article_id = None
+        if article_id is not None:
+            await add_article_comment_count(db, article_id, -1)
+        await db.commit()
+        comment_count_cache.clear()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def update_comment(db: Session, comment_id: int, comment: schemas.CommentUpdate):
+async def update_comment(
+    db: AsyncSession, comment_id: int, comment: schemas.CommentUpdate
+):
     try:
-        db.query(models.Comment).filter(models.Comment.id == comment_id).update(
-            comment.model_dump(exclude_unset=True)
+        await db.execute(
+            update(models.Comment)
+            .filter(models.Comment.id == comment_id)
+            .values(comment.model_dump(exclude_unset=True))
         )
-        db.commit()
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def add_comment_like(db: Session, comment_id: int):
-    comment_to_update = get_comment(db, comment_id)
-    if comment_to_update is None:
+async def add_comment_votes(db: AsyncSession, votes: dict[int, tuple[int, int]]):
+    """add (like, dislike) increments to many comments in one batched update,
+    update_time is set by the column onupdate
+    """
+    comment = models.Comment.__table__
+    statement = (
+        update(comment)
+        .where(comment.c.id == bindparam("comment_id"))
+        .values(
+            like=comment.c.like + bindparam("like_delta"),
+            dislike=comment.c.dislike + bindparam("dislike_delta"),
+        )
+    )
+    params = [
+        {"comment_id": comment_id, "like_delta": like, "dislike_delta": dislike}
+        for comment_id, (like, dislike) in votes.items()
+    ]
+    if not params:
         return True
     try:
-        comment_to_update.like += 1
-        db.commit()
+        await db.execute(statement, params)
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
 
 
-def add_comment_dislike(db: Session, comment_id: int):
-    comment_to_update = get_comment(db, comment_id)
-    if comment_to_update is None:
-        return True
-    try:
-        comment_to_update.dislike += 1
-        db.commit()
-    except SQLAlchemyError as e:
-        db.rollback()
-        return False
-    return True
+async def add_comment_like(db: AsyncSession, comment_id: int):
+    return await add_comment_votes(db, {comment_id: (1, 0)})
+
+
+async def add_comment_dislike(db: AsyncSession, comment_id: int):
+    return await add_comment_votes(db, {comment_id: (0, 1)})
+
+
+class CommentVoteBuffer:
+    """sums like/dislike clicks in memory and writes them every `interval`
+    seconds with `add_comment_votes`, so hot comments cost one update per flush
+    """
+
+    def __init__(self, session_factory, interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.votes: dict[int, tuple[int, int]] = {}
+        self.task = None
+        self.stopping = asyncio.Event()
+
+    def add(self, comment_id: int, like: int = 0, dislike: int = 0):
+        old_like, old_dislike = self.votes.get(comment_id, (0, 0))
+        self.votes[comment_id] = (old_like + like, old_dislike + dislike)
+
+    async def flush(self):
+        votes, self.votes = self.votes, {}
+        if not votes:
+            return
+        success = False
+        try:
+            async with self.session_factory() as db:
+                success = await add_comment_votes(db, votes)
+        finally:
+            # keep the clicks for the next flush instead of dropping them,
+            # also when the write raised or was cancelled
+            if not success:
+                logger.warning("fail to flush votes of %d comments", len(votes))
+                for comment_id, (like, dislike) in votes.items():
+                    self.add(comment_id, like, dislike)
+
+    async def run(self):
+        while not self.stopping.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.stopping.wait(), self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("unexpected error while flushing comment votes")
+
+    def start(self):
+        self.stopping.clear()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        # let the loop finish its current flush instead of cancelling it
+        if self.task is not None:
+            self.stopping.set()
+            await self.task
+            self.task = None
+        await self.flush()
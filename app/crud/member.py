@@ -1,30 +1,49 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from ..utils import verify_password, get_password_hash
+from ..utils import verify_password_async, get_password_hash_async
 
 from .. import models
 from .. import schemas
+from .cache import member_cache
+from .snapshot import refresh_article_snapshots
 
 
-def get_member(db: Session, member_id: int):
-    return db.query(models.Member).filter(models.Member.id == member_id).first()
+async def get_member(db: AsyncSession, member_id: int):
+    return await db.scalar(
+        select(models.Member).filter(models.Member.id == member_id)
+    )
 
 
-def get_member_by_name(db: Session, member_name: str):
-    return db.query(models.Member).filter(models.Member.name == member_name).first()
+async def get_member_by_name(db: AsyncSession, member_name: str):
+    return await db.scalar(
+        select(models.Member).filter(models.Member.name == member_name)
+    )
 
 
-def authenticate_member(db: Session, member_name: str, password: str):
-    member: models.Member = get_member_by_name(db, member_name)
+async def get_cached_member_by_name(db: AsyncSession, member_name: str):
+    member = member_cache.get(member_name)
+    if member is None:
+        db_member = await get_member_by_name(db, member_name)
+        if db_member is None:
+            return None
+        # cache a detached copy, orm objects are bound to their session
+        member = schemas.Member.model_validate(db_member)
+        member_cache.set(member_name, member)
+    return member
+
+
+async def authenticate_member(db: AsyncSession, member_name: str, password: str):
+    member: models.Member = await get_member_by_name(db, member_name)
     if member is None:
         return None
-    if not verify_password(password, member.hashed_password):
+    if not await verify_password_async(password, member.hashed_password):
         return None
     return member
 
 
-def list_members(
-    db: Session,
+async def list_members(
+    db: AsyncSession,
     name_like: str = None,
     role: models.Role = None,
     is_active: bool = None,
@@ -38,35 +57,47 @@ def list_members(
         params.append(models.Member.role == role)
     if is_active:
         params.append(models.Member.is_active == is_active)
-    return db.query(models.Member).filter(*params).offset(skip).limit(limit).all()
+    result = await db.scalars(
+        select(models.Member).filter(*params).offset(skip).limit(limit)
+    )
+    return result.all()
 
 
-def create_member(db: Session, member: schemas.MemberCreate):
-    hashed_password = get_password_hash(member.password)
+async def create_member(db: AsyncSession, member: schemas.MemberCreate):
+    hashed_password = await get_password_hash_async(member.password)
     try:
         db_member = models.Member(
             **member.model_dump(exclude=["password"]), hashed_password=hashed_password
         )
         db.add(db_member)
-        db.commit()
+        await db.commit()
     except SQLAlchemyError:
-        db.rollback()
+        await db.rollback()
         return None
 
-    db.refresh(db_member)
+    await db.refresh(db_member)
     return db_member
 
 
-def update_member(db: Session, member_id: int, member: schemas.MemberUpdate):
+async def update_member(db: AsyncSession, member_id: int, member: schemas.MemberUpdate):
     try:
         params = member.model_dump(exclude_unset=True, exclude=["password"])
         if member.password is not None:
             params.update(
-                {"hashed_password": get_password_hash(member.password)}
+                {"hashed_password": await get_password_hash_async(member.password)}
+            )
+        await db.execute(
+            update(models.Member).filter(models.Member.id == member_id).values(params)
+        )
+        if "name" in params:
+            await db.run_sync(
+                refresh_article_snapshots, models.Article.writer_id == member_id
             )
-        db.query(models.Member).filter(models.Member.id == member_id).update(params)
-        db.commit()
+        await db.commit()
+        for name, cached_member in member_cache.items():
+            if cached_member.id == member_id:
+                member_cache.pop(name)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
@@ -0,0 +1,64 @@
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+
+from .. import models
+from .. import schemas
+
+
+def article_snapshot_query(*criteria):
+    return (
+        select(models.Article)
+        .filter(*criteria)
+        .options(
+            load_only(
+                models.Article.id,
+                models.Article.title,
+                models.Article.create_time,
+                models.Article.update_time,
+                models.Article.is_deleted,
+                models.Article.comment_count,
+                models.Article.category_id,
+                models.Article.writer_id,
+            ),
+            joinedload(models.Article.writer).load_only(
+                models.Member.id, models.Member.name
+            ),
+            joinedload(models.Article.category),
+            selectinload(models.Article.tags),
+        )
+    )
+
+
+def encode_article_snapshot(article: models.Article):
+    return schemas.ArticleSimplify.model_validate(
+        article, from_attributes=True
+    ).model_dump_json()
+
+
+def refresh_article_snapshots(session: Session, *criteria, batch_size: int = 500):
+    """rewrite the snapshot of every article matching the criteria inside the
+    current transaction, called through AsyncSession.run_sync by the crud
+    write paths
+    """
+    session.flush()
+    article_ids = session.scalars(select(models.Article.id).filter(*criteria)).all()
+    table = models.Article.__table__
+    # keep update_time, a new snapshot is not a change of the article
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("article_id"))
+        .values(snapshot=bindparam("snapshot_json"), update_time=table.c.update_time)
+    )
+    for start in range(0, len(article_ids), batch_size):
+        articles = session.scalars(
+            article_snapshot_query(
+                models.Article.id.in_(article_ids[start:start + batch_size])
+            ).execution_options(populate_existing=True)
+        )
+        session.execute(
+            statement,
+            [
+                {"article_id": article.id, "snapshot_json": encode_article_snapshot(article)}
+                for article in articles
+            ],
+        )
@@ -1,43 +1,95 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
 from .. import models
 from .. import schemas
+from .. import utils
+from .snapshot import refresh_article_snapshots
 
 
-def get_tag(db: Session, tag_id: int):
-    return db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+async def get_tag(db: AsyncSession, tag_id: int):
+    return await db.scalar(select(models.Tag).filter(models.Tag.id == tag_id))
 
 
-def get_tag_by_name(db: Session, tag_name: str):
-    return db.query(models.Tag).filter(models.Tag.name == tag_name).first()
+async def get_tag_by_name(db: AsyncSession, tag_name: str):
+    return await db.scalar(select(models.Tag).filter(models.Tag.name == tag_name))
 
 
-def list_tags(db: Session, hide_unused: bool = False):
+async def resolve_tags(db: AsyncSession, tag_names: list[str]):
+    """map names to tag ids, upserting the missing tags, without committing"""
+    # missing names are inserted in the given order, keeping their ids stable
+    tag_names = list(dict.fromkeys(tag_names))
+    if not tag_names:
+        return {}
+    query = select(models.Tag.name, models.Tag.id).filter(
+        models.Tag.name.in_(tag_names)
+    )
+    tag_ids = dict((await db.execute(query)).all())
+    missing = [name for name in tag_names if name not in tag_ids]
+    if missing:
+        await db.execute(
+            utils.insert_ignore(db.get_bind().dialect.name, models.Tag),
+            [{"name": name} for name in missing],
+        )
+        tag_ids = dict((await db.execute(query)).all())
+    return tag_ids
+
+
+async def list_tags(db: AsyncSession, hide_unused: bool = False, order_by: str = "id"):
     params = []
     if hide_unused:
-        tag_ids = db.query(models.article2tag.c.tag_id)
-        params.append(models.Tag.id.in_(tag_ids))
-    return db.query(models.Tag).filter(*params).all()
+        params.append(models.Tag.article_count > 0)
+    query = utils.apply_order(select(models.Tag).filter(*params), models.Tag, order_by)
+    result = await db.scalars(query)
+    return result.all()
+
+
+async def add_tag_article_counts(db: AsyncSession, deltas: dict[int, int]):
+    """add article_count increments to many tags in one batched update,
+    without committing
+    """
+    tag = models.Tag.__table__
+    params = [
+        {"tag_id": tag_id, "delta": delta}
+        for tag_id, delta in deltas.items()
+        if tag_id is not None and delta != 0
+    ]
+    if not params:
+        return
+    await db.execute(
+        update(tag)
+        .where(tag.c.id == bindparam("tag_id"))
+        .values(article_count=tag.c.article_count + bindparam("delta")),
+        params,
+    )
 
 
-def create_tag(db: Session, tag: schemas.TagCreate):
+async def create_tag(db: AsyncSession, tag: schemas.TagCreate):
     try:
         db_tag = models.Tag(**tag.model_dump())
         db.add(db_tag)
-        db.commit()
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return None
-    db.refresh(db_tag)
+    await db.refresh(db_tag)
     return db_tag
 
 
-def delete_tag(db: Session, tag_id: int):
+async def delete_tag(db: AsyncSession, tag_id: int):
     try:
-        db.query(models.Tag).filter(models.Tag.id == tag_id).delete()
-        db.commit()
+        await db.execute(delete(models.Tag).filter(models.Tag.id == tag_id))
+        await db.run_sync(
+            refresh_article_snapshots,
+            models.Article.id.in_(
+                select(models.article2tag.c.article_id).filter(
+                    models.article2tag.c.tag_id == tag_id
+                )
+            ),
+        )
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return False
     return True
@@ -1,8 +1,114 @@
-from sqlalchemy import create_engine, URL
+import time
+from sqlalchemy import (
+    Column,
+    Integer,
+    Table,
+    URL,
+    create_engine,
+    delete,
+    event,
+    insert,
+    inspect,
+    make_url,
+    select,
+)
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
 from .dependencies import config
 
 
+# async driver used for each backend when the configured one is blocking
+async_drivers = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def to_async_url(url: str | URL):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    driver = async_drivers.get(backend)
+    if driver is None or url.get_driver_name() == driver:
+        return url
+    return url.set(drivername=f"{backend}+{driver}")
+
+
+def is_memory_sqlite(url: str | URL):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def pool_options(url: str | URL, settings: config.Settings, is_async: bool = False):
+    if is_memory_sqlite(url):
+        # one shared connection, there is no pool to size
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if is_async and make_url(url).get_backend_name() == "sqlite":
+        # aiosqlite defaults to opening a connection per checkout
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+def set_sqlite_pragmas(engine, settings: config.Settings):
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {
+        "journal_mode": settings.db_sqlite_journal_mode,
+        "synchronous": settings.db_sqlite_synchronous,
+        "busy_timeout": settings.db_sqlite_busy_timeout,
+        "mmap_size": settings.db_sqlite_mmap_size,
+        "cache_size": settings.db_sqlite_cache_size,
+    }
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class ReplicaSet:
+    """round robin over replica session factories, skipping the replicas that
+    failed within the last `cooldown` seconds
+    """
+
+    def __init__(self, session_factories: list, cooldown: float = 30):
+        self.session_factories = list(session_factories)
+        self.cooldown = cooldown
+        self.down_until = [0.0] * len(self.session_factories)
+        self.next = 0
+
+    def candidates(self):
+        """(index, session factory) of the healthy replicas in rotation order"""
+        count = len(self.session_factories)
+        if count == 0:
+            return []
+        start = self.next
+        self.next = (start + 1) % count
+        now = time.monotonic()
+        return [
+            (index, self.session_factories[index])
+            for index in ((start + offset) % count for offset in range(count))
+            if self.down_until[index] <= now
+        ]
+
+    def mark_down(self, index: int):
+        self.down_until[index] = time.monotonic() + self.cooldown
+
+    def __len__(self):
+        return len(self.session_factories)
+
+
 settings = config.get_settings()
 
 if settings.db_url is not None:
@@ -18,8 +124,91 @@ else:
         query=settings.db_query.model_dump(),
     )
 
-engine = create_engine(connect_url)
+# the blocking engine is kept for schema management and tooling,
+# request handlers only use the async engine
+engine = create_engine(connect_url, **pool_options(connect_url, settings))
+set_sqlite_pragmas(engine, settings)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    to_async_url(connect_url), **pool_options(connect_url, settings, is_async=True)
+)
+set_sqlite_pragmas(async_engine.sync_engine, settings)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+def is_replica(db) -> bool:
+    """whether the session reads from a replica, its results must not fill the
+    per-process caches, which only writes to the primary invalidate
+    """
+    return db.info.get("replica", False)
+
+
+replica_engines = []
+for replica_url in settings.db_replica_urls:
+    replica_engine = create_async_engine(
+        to_async_url(replica_url),
+        **pool_options(replica_url, settings, is_async=True),
+    )
+    set_sqlite_pragmas(replica_engine.sync_engine, settings)
+    replica_engines.append(replica_engine)
+
+replicas = ReplicaSet(
+    [
+        async_sessionmaker(replica_engine, autoflush=False, expire_on_commit=False)
+        for replica_engine in replica_engines
+    ],
+    settings.db_replica_cooldown,
+)
+
 Base = declarative_base()
+
+# bumped with every model change that init-db has to apply to a database
+schema_version = 4
+
+schema_version_table = Table(
+    "schema_version", Base.metadata, Column("version", Integer, primary_key=True)
+)
+
+
+def get_schema_version(connection):
+    if not inspect(connection).has_table(schema_version_table.name):
+        return None
+    return connection.execute(select(schema_version_table.c.version)).scalar()
+
+
+def set_schema_version(connection, version: int = schema_version):
+    connection.execute(delete(schema_version_table))
+    connection.execute(insert(schema_version_table), {"version": version})
+
+
+def add_missing_columns(connection):
+    # create_all skips existing tables, so columns added later to a model are
+    # added here, the (table, column) names added are returned
+    added = set()
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"
+            )
+            added.add((table.name, column.name))
+    return added
+
+
+def create_missing_indexes(connection):
+    # create_all skips existing tables, so indexes added later to a model are
+    # created here for databases made by older versions
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
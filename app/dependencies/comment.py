@@ -0,0 +1,6 @@
+from fastapi import Request
+
+
+def get_comment_vote_buffer(request: Request):
+    # None when write-behind is disabled, then votes are written directly
+    return getattr(request.app.state, "comment_vote_buffer", None)
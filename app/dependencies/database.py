@@ -1,9 +1,66 @@
-from ..database import SessionLocal
+import logging
+from fastapi import Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import DBAPIError
 
+from .. import database
+from ..config import Settings
+from .config import get_settings
 
-def get_db():
-    db = SessionLocal()
-    try:
+logger = logging.getLogger(__name__)
+
+# requests that may be served by a replica
+read_methods = {"GET", "HEAD"}
+
+# set after a write, reads of that client go to the primary until it expires
+primary_cookie = "wblog_primary"
+
+
+async def connect_replica():
+    for index, session_factory in database.replicas.candidates():
+        db = session_factory()
+        try:
+            # checks a connection out of the replica pool, pre-ping included
+            await db.connection()
+        except (DBAPIError, OSError) as e:
+            await db.close()
+            database.replicas.mark_down(index)
+            logger.warning("replica %d is down: %s", index, e)
+            continue
+        # what is read here may lag behind the primary, see database.is_replica
+        db.info["replica"] = True
+        return db
+    return None
+
+
+async def get_db(
+    request: Request,
+    response: Response,
+    setting: Settings = Depends(get_settings),
+):
+    db = None
+    if request.method in read_methods and primary_cookie not in request.cookies:
+        db = await connect_replica()
+    if db is None:
+        if (
+            request.method not in read_methods
+            and len(database.replicas) > 0
+            and setting.db_read_your_writes > 0
+        ):
+            response.set_cookie(
+                primary_cookie, "1", max_age=setting.db_read_your_writes, httponly=True
+            )
+        db = database.AsyncSessionLocal()
+    async with db:
+        yield db
+
+
+async def get_primary_db(db: AsyncSession = Depends(get_db)):
+    """the request session when it is on the primary, otherwise a primary session
+    of its own, for reads that must see every committed write (authentication)
+    """
+    if not database.is_replica(db):
         yield db
-    finally:
-        db.close()
+        return
+    async with database.AsyncSessionLocal() as primary:
+        yield primary
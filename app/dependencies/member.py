@@ -1,13 +1,13 @@
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .oauth2 import oauth2_scheme
-from .database import get_db
+from .database import get_primary_db
 from ..utils import jwt_decode
 from .. import crud, models
 import jwt
 
 async def get_current_member(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_primary_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,7 +23,7 @@ async def get_current_member(
     name: str = payload.get("sub")
     if name is None:
         raise credentials_exception
-    user = crud.get_member_by_name(db, name)
+    user = await crud.get_cached_member_by_name(db, name)
     if user is None:
         raise credentials_exception
     return user
@@ -37,3 +37,13 @@ async def get_current_active_member(
             status_code=status.HTTP_400_BAD_REQUEST, detail="member is inactive"
         )
     return current_member
+
+
+async def get_current_owner(
+    current_member: models.Member = Depends(get_current_active_member),
+):
+    if current_member.role != models.Role.OWNER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="owner only operation"
+        )
+    return current_member
@@ -1,12 +1,54 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from .routers import router
-from . import database
+from .routers import router, metrics
+from .middleware import ServerTimingMiddleware, MetricsMiddleware, instrument_pool
+from . import crud, database, utils
+from .dependencies.config import get_settings
 
-database.Base.metadata.create_all(bind=database.engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    # the schema is created and upgraded by `python -m app init-db`,
+    # workers only check that it was run for this version
+    async with database.async_engine.connect() as connection:
+        version = await connection.run_sync(database.get_schema_version)
+    if version != database.schema_version:
+        raise RuntimeError(
+            f"database schema version is {version}, expected "
+            f"{database.schema_version}, run `python -m app init-db`"
+        )
+    comment_vote_buffer = None
+    if settings.comment_vote_flush_ms > 0:
+        comment_vote_buffer = crud.CommentVoteBuffer(
+            database.AsyncSessionLocal, settings.comment_vote_flush_ms / 1000
+        )
+        comment_vote_buffer.start()
+    app.state.comment_vote_buffer = comment_vote_buffer
+    if crud.article_bitmap_index.enabled:
+        logger.warning(
+            "article bitmap index is kept per process, it is only correct when "
+            "a single worker writes the database"
+        )
+        async with database.AsyncSessionLocal() as db:
+            await crud.load_article_bitmap_index(db)
+    yield
+    if comment_vote_buffer is not None:
+        await comment_vote_buffer.stop()
+    await database.async_engine.dispose()
+    for replica_engine in database.replica_engines:
+        await replica_engine.dispose()
+    database.engine.dispose()
+    utils.shutdown_password_hasher()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -19,7 +61,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Total-Count"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
+settings = get_settings()
+if settings.server_timing:
+    app.add_middleware(ServerTimingMiddleware, query_budget=settings.sql_query_budget)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+    instrument_pool(database.async_engine.pool)
+
 app.include_router(router)
+
+
+@app.exception_handler(utils.PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: utils.PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "too many password operations, try again later"},
+        headers={"Retry-After": "1"},
+    )
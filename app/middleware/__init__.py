@@ -0,0 +1,2 @@
+from .timing import *
+from .metrics import *
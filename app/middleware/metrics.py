@@ -0,0 +1,204 @@
+import os
+import time
+from .. import crud, database
+
+# every worker keeps its own series, labelled with its pid so scrapes of
+# different workers behind a load balancer never overwrite each other
+worker = str(os.getpid())
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    pairs = [("worker", worker), *zip(names, values)]
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=latency_buckets
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> per bucket counts (not cumulative), then sum and count
+        self.values = {}
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        names = (*self.labelnames, "le")
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    format_labels(names, (*labels, bound)),
+                    cumulative,
+                )
+            yield f"{self.name}_bucket", format_labels(
+                names, (*labels, "+Inf")
+            ), series[-1]
+            yield f"{self.name}_sum", format_labels(self.labelnames, labels), series[-2]
+            yield f"{self.name}_count", format_labels(self.labelnames, labels), series[
+                -1
+            ]
+
+
+request_duration = Histogram(
+    "wblog_http_request_duration_seconds",
+    "Latency of http requests by route template.",
+    ("method", "route"),
+)
+requests_total = Counter(
+    "wblog_http_requests_total",
+    "Finished http requests by route template and status.",
+    ("method", "route", "status"),
+)
+requests_in_progress = Gauge(
+    "wblog_http_requests_in_progress", "Http requests being served.", ("method",)
+)
+pool_checkout_wait = Histogram(
+    "wblog_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool.",
+)
+
+
+def collect_gauges():
+    gauges = []
+    pool = database.async_engine.pool
+    for name, documentation, stat in [
+        ("wblog_db_pool_size", "Connections the pool keeps open.", "size"),
+        ("wblog_db_pool_checked_out", "Connections in use.", "checkedout"),
+        ("wblog_db_pool_overflow", "Connections opened over the size.", "overflow"),
+    ]:
+        if hasattr(pool, stat):
+            gauge = Gauge(name, documentation)
+            gauge.set(value=getattr(pool, stat)())
+            gauges.append(gauge)
+
+    for cache_name, cache in [
+        ("member", crud.member_cache),
+        ("article_count", crud.article_count_cache),
+        ("comment_count", crud.comment_count_cache),
+    ]:
+        for result in ["hits", "misses"]:
+            counter = Counter(
+                f"wblog_{cache_name}_cache_{result}_total",
+                f"Lookups in the {cache_name.replace('_', ' ')} cache, {result}.",
+            )
+            counter.inc(amount=getattr(cache, result))
+            gauges.append(counter)
+    return gauges
+
+
+def render_metrics():
+    lines = []
+    for metric in [
+        request_duration,
+        requests_total,
+        requests_in_progress,
+        pool_checkout_wait,
+        *collect_gauges(),
+    ]:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_pool(pool):
+    # the pool has no event before a checkout, so time its internal getter
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+
+
+class MetricsMiddleware:
+    """record latency, status and in-flight requests labelled by the route
+    template that served them, e.g. /api/v1/article/{article_id}
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        requests_in_progress.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_progress.dec(method)
+            # the router stores the matched route in the scope
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            request_duration.observe(time.perf_counter() - start, method, template)
+            requests_total.inc(method, template, str(status))
@@ -0,0 +1,85 @@
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+
+    def server_timing(self):
+        total = (time.perf_counter() - self.start) * 1000
+        db = self.db_time * 1000
+        return (
+            f"db;dur={db:.2f}, "
+            f'db-count;desc="{self.db_count}", '
+            f"app;dur={max(total - db, 0):.2f}"
+        )
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+# listen on every engine, so the async engine, the blocking one and engines
+# made elsewhere (tests, replicas) are all accounted for
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats.get()
+    start_times = conn.info.get("query_start_time")
+    if stats is None or not start_times:
+        return
+    stats.db_count += 1
+    stats.db_time += time.perf_counter() - start_times.pop()
+
+
+class ServerTimingMiddleware:
+    """count statements and database time of each request and report them in
+    a Server-Timing header, logging requests that run more than `query_budget`
+    statements when it is set
+    """
+
+    def __init__(self, app, query_budget: int = 0):
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            if self.query_budget and stats.db_count > self.query_budget:
+                logger.warning(
+                    "%s %s ran %d statements, over the budget of %d",
+                    scope["method"],
+                    scope["path"],
+                    stats.db_count,
+                    self.query_budget,
+                )
@@ -8,16 +8,29 @@ from sqlalchemy import (
     Text,
     DateTime,
     Table,
+    Index,
+    DDL,
+    bindparam,
+    event,
+    func,
+    inspect,
+    select,
+    text,
+    update,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from ..database import Base
+from .category import Category
+from .comment import Comment
+from .tag import Tag
 
 article2tag = Table(
     "article2tag",
     Base.metadata,
     Column("article_id", ForeignKey("article.id"), primary_key=True),
     Column("tag_id", ForeignKey("tag.id"), primary_key=True),
+    Index("ix_article2tag_tag_id_article_id", "tag_id", "article_id"),
 )
 
 
@@ -26,12 +39,19 @@ class Article(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     title = Column(String, nullable=False, unique=True)
-    content = Column(Text, nullable=False, default="")
+    # bodies can be large, only the detail path asks for them
+    content = deferred(Column(Text, nullable=False, default=""))
     create_time = Column(DateTime, nullable=False, default=datetime.utcnow)
     update_time = Column(
         DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
     )
     is_deleted = Column(Boolean, nullable=False, default=False)
+    # kept in step by crud.create_comment/delete_comment, repaired by
+    # `python -m app count-comments`
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # pre-encoded ArticleSimplify json served by the list endpoint, rewritten
+    # by crud.refresh_article_snapshots, null until init-db backfills it
+    snapshot = deferred(Column(Text))
 
     category_id = Column(Integer, ForeignKey("category.id"))
     writer_id = Column(Integer, ForeignKey("member.id"))
@@ -40,3 +60,122 @@ class Article(Base):
     comments = relationship("Comment", back_populates="article", cascade="all, delete")
     category = relationship("Category", back_populates="articles")
     tags = relationship("Tag", secondary="article2tag", back_populates="articles")
+
+    # one index per filter/order pair used by crud.list_articles, id is the
+    # keyset pagination tie-breaker
+    __table_args__ = (
+        Index("ix_article_create_time", "create_time", "id"),
+        Index("ix_article_update_time", "update_time", "id"),
+        Index("ix_article_is_deleted_create_time", "is_deleted", "create_time", "id"),
+        Index("ix_article_is_deleted_update_time", "is_deleted", "update_time", "id"),
+        Index("ix_article_category_id_create_time", "category_id", "create_time", "id"),
+        Index("ix_article_writer_id_create_time", "writer_id", "create_time", "id"),
+        Index("ix_article_comment_count", "comment_count", "id"),
+    )
+
+
+# full-text index over title and content, kept in sync by the database itself
+# so every write path (orm, bulk or raw sql) updates it in the same transaction
+sqlite_search_ddl = [
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5("
+        "title, content, content='article', content_rowid='id')"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS article_fts_ai AFTER INSERT ON article BEGIN "
+        "INSERT INTO article_fts(rowid, title, content) "
+        "VALUES (new.id, new.title, new.content); END"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS article_fts_ad AFTER DELETE ON article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); END"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS article_fts_au "
+        "AFTER UPDATE OF title, content ON article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); "
+        "INSERT INTO article_fts(rowid, title, content) "
+        "VALUES (new.id, new.title, new.content); END"
+    ),
+]
+
+postgresql_search_ddl = [
+    DDL(
+        "ALTER TABLE article ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'B')) STORED"
+    ),
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_article_search_vector "
+        "ON article USING GIN (search_vector)"
+    ),
+]
+
+
+def create_search_index(target, connection, **kw):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        if inspect(connection).has_table("article_fts"):
+            return
+        for ddl in sqlite_search_ddl:
+            connection.execute(ddl)
+        # index the rows written before the search table existed
+        connection.execute(
+            text("INSERT INTO article_fts(article_fts) VALUES ('rebuild')")
+        )
+    elif dialect == "postgresql":
+        for ddl in postgresql_search_ddl:
+            connection.execute(ddl)
+
+
+event.listen(Article.__table__, "after_create", create_search_index)
+
+
+def count_articles(connection):
+    """recompute the article_count of every tag and category"""
+    connection.execute(
+        update(Tag.__table__).values(
+            article_count=select(func.count())
+            .where(article2tag.c.tag_id == Tag.__table__.c.id)
+            .scalar_subquery()
+        )
+    )
+    connection.execute(
+        update(Category.__table__).values(
+            article_count=select(func.count())
+            .where(Article.__table__.c.category_id == Category.__table__.c.id)
+            .scalar_subquery()
+        )
+    )
+
+
+def count_comments(connection):
+    """recompute the comment_count of every article from one grouped count,
+    returning the ids of the articles whose count was wrong
+    """
+    article = Article.__table__
+    counts = (
+        select(Comment.article_id, func.count().label("comment_count"))
+        .group_by(Comment.article_id)
+        .subquery()
+    )
+    actual = func.coalesce(counts.c.comment_count, 0)
+    rows = connection.execute(
+        select(article.c.id, actual)
+        .outerjoin(counts, counts.c.article_id == article.c.id)
+        .where(article.c.comment_count != actual)
+    ).all()
+    if rows:
+        connection.execute(
+            update(article)
+            .where(article.c.id == bindparam("article_id"))
+            .values(
+                comment_count=bindparam("actual_count"),
+                update_time=article.c.update_time,
+            ),
+            [{"article_id": id, "actual_count": count} for id, count in rows],
+        )
+    return [id for id, _ in rows]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Index
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -14,9 +14,22 @@ class Comment(Base):
     like = Column(Integer, nullable=False, default=0)
     dislike = Column(Integer, nullable=False, default=0)
     create_time = Column(DateTime, nullable=False, default=datetime.now)
+    # set by every update, edits and votes included, for incremental exports.
+    # nullable so init-db can add it to older databases, it fills it from
+    # create_time there
+    update_time = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     article_id = Column(Integer, ForeignKey("article.id"))
     member_id = Column(Integer, ForeignKey("member.id"), nullable=True)
 
     article = relationship("Article", back_populates="comments")
     member = relationship("Member", back_populates="comments")
+
+    # indexes for the filter/order pairs used by crud.list_comments
+    __table_args__ = (
+        Index("ix_comment_create_time", "create_time", "id"),
+        Index("ix_comment_update_time", "update_time", "id"),
+        Index("ix_comment_article_id_create_time", "article_id", "create_time", "id"),
+        Index("ix_comment_article_id_like", "article_id", "like", "id"),
+        Index("ix_comment_member_id_create_time", "member_id", "create_time", "id"),
+    )
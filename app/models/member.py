@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Boolean, Column, Integer, String, Enum, event
+from sqlalchemy import Boolean, Column, Integer, String, Enum, select
 from sqlalchemy.orm import relationship
 from ..dependencies import config
 from ..utils import get_password_hash
@@ -26,16 +26,19 @@ class Member(Base):
     comments = relationship("Comment", back_populates="member")
 
 
-def create_owner_data(target, connection, **kw):
+def create_owner_data(connection):
+    # run by init-db, the owner is only created once
+    owner = connection.execute(
+        select(Member.id).filter(Member.role == Role.OWNER).limit(1)
+    ).first()
+    if owner is not None:
+        return
     settings = config.get_settings()
     connection.execute(
-        target.insert(),
+        Member.__table__.insert(),
         {
             "name": settings.owner_name,
             "hashed_password": get_password_hash(settings.owner_password),
             "role": Role.OWNER,
         },
     )
-
-
-event.listen(Member.__table__, "after_create", create_owner_data)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -9,5 +9,11 @@ class Tag(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     name = Column(String, nullable=False, unique=True)
+    # kept in step with the articles by every crud write path
+    article_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     articles = relationship("Article", secondary="article2tag", back_populates="tags")
+
+    __table_args__ = (
+        Index("ix_tag_article_count", "article_count", "id"),
+    )
@@ -2,7 +2,7 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, Path, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import crud, schemas, models
 from ..dependencies.database import get_db
 from ..dependencies.config import get_settings
@@ -18,10 +18,10 @@ router = APIRouter(
 @router.post("/", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     setting: Settings = Depends(get_settings),
 ):
-    member: models.Member = crud.authenticate_member(db, form_data.username, form_data.password)
+    member: models.Member = await crud.authenticate_member(db, form_data.username, form_data.password)
     if member is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,20 +1,35 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, Path, HTTPException, Query, status, Body, Response
+from fastapi import (
+    APIRouter,
+    Depends,
+    Path,
+    HTTPException,
+    Query,
+    status,
+    Body,
+    Header,
+    Request,
+    Response,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from sqlalchemy.orm import Session
-from ... import crud, schemas, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from ... import crud, schemas, models, utils
 from ...dependencies.database import get_db
-from ...dependencies.member import get_current_active_member
+from ...dependencies.member import get_current_active_member, get_current_owner
+from ...dependencies.config import get_settings
+from ...config import Settings
 
 router = APIRouter(
     prefix="/article",
     tags=["article"],
+    route_class=utils.ModelRoute,
 )
 
 
 @router.get("/", response_model=list[schemas.ArticleSimplify])
 async def list_articles(
-    response: Response,
     title_like: str = Query(None, min_length=1, max_length=50),
     content_has: str = None,
     category_id: int = Query(None, gt=0),
@@ -26,13 +41,28 @@ async def list_articles(
     update_time_before: datetime = None,
     is_deleted: bool = None,
     order_by: str = Query(
-        "-create_time", pattern="^-?(create_time|update_time|title)$"
+        "-create_time", pattern="^-?(create_time|update_time|title|comment_count)$"
     ),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
-    db: Session = Depends(get_db),
+    q: str = Query(None, min_length=1, max_length=100),
+    cursor: str = None,
+    with_total: bool = True,
+    db: AsyncSession = Depends(get_db),
 ):
-    articles, total = crud.list_articles(
+    after = None
+    if cursor is not None:
+        if q is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="cursor can not be used with q",
+            )
+        after = utils.decode_cursor(cursor, models.Article, order_by)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor"
+            )
+    articles, total = await crud.list_articles(
         db,
         title_like,
         content_has,
@@ -47,32 +77,79 @@ async def list_articles(
         order_by,
         skip,
         limit,
+        q,
+        after,
+        with_total,
+    )
+    headers = {}
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    if q is None and len(articles) == limit:
+        headers["X-Next-Cursor"] = utils.encode_cursor(articles[-1], order_by)
+    # the rows are already ArticleSimplify json, skip validation and encoding
+    snapshots = await crud.get_article_snapshots(db, articles)
+    return Response(
+        ("[" + ",".join(snapshots) + "]").encode(),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(get_current_owner)],
+)
+async def export_articles(
+    updated_since: datetime = None,
+    db: AsyncSession = Depends(get_db),
+    setting: Settings = Depends(get_settings),
+):
+    batches = crud.stream_articles(db, updated_since, setting.export_batch_size)
+    return StreamingResponse(
+        utils.encode_ndjson(batches, schemas.ArticleExport),
+        media_type="application/x-ndjson",
     )
-    response.headers["X-Total-Count"] = str(total)
-    return articles
 
 
 @router.get("/{article_id}", response_model=schemas.Article)
-async def get_article(article_id: int = Path(gt=0), db: Session = Depends(get_db)):
-    result_article = crud.get_article(db, article_id)
+async def get_article(
+    response: Response,
+    article_id: int = Path(gt=0),
+    if_none_match: str = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    version = await crud.get_article_version(db, article_id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="article not found"
+        )
+    etag = utils.make_etag(article_id, *version)
+    if utils.etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    result_article = await crud.get_article(db, article_id)
     if result_article is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="article not found"
         )
+    response.headers["ETag"] = etag
     return result_article
 
 
 @router.post("/", response_model=schemas.ArticleSimplify)
 async def create_article(
     article: schemas.ArticleCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    if crud.get_article_by_title(db, article.title) is not None:
+    if await crud.get_article_by_title(db, article.title) is not None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="article title already exist"
         )
-    article_created = crud.create_article(db, current_member.id, article)
+    article_created = await crud.create_article(db, current_member.id, article)
     if article_created is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to create article"
@@ -80,13 +157,51 @@ async def create_article(
     return article_created
 
 
+@router.post("/bulk", response_model=list[schemas.ArticleImportResult])
+async def bulk_create_articles(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_member: models.Member = Depends(get_current_active_member),
+    setting: Settings = Depends(get_settings),
+):
+    # the body is ndjson, one ArticleCreate per line
+    results = []
+    chunk = []
+
+    async def create_chunk():
+        created = await crud.bulk_create_articles(
+            db, current_member.id, [article for _, article in chunk]
+        )
+        for (line, _), result in zip(chunk, created):
+            if isinstance(result, int):
+                results.append(schemas.ArticleImportResult(line=line, id=result))
+            else:
+                results.append(schemas.ArticleImportResult(line=line, error=result))
+        chunk.clear()
+
+    async for line, data in utils.iter_ndjson_lines(request.stream()):
+        try:
+            chunk.append((line, schemas.ArticleCreate.model_validate_json(data)))
+        except ValidationError as e:
+            message = f"invalid article: {e.errors()[0]['msg']}"
+            results.append(schemas.ArticleImportResult(line=line, error=message))
+            continue
+        if len(chunk) >= setting.article_import_chunk_size:
+            await create_chunk()
+    if chunk:
+        await create_chunk()
+
+    results.sort(key=lambda result: result.line)
+    return results
+
+
 @router.delete("/{article_id}")
 async def delete_article(
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    article: models.Article = crud.get_article(db, article_id)
+    article: models.Article = await crud.get_article(db, article_id)
     if article is None:
         return  # no article to delete, so just return
     if not article.is_deleted:
@@ -106,7 +221,7 @@ async def delete_article(
             detail="no permission to delete article",
         )
 
-    success = crud.delete_article(db, article_id)
+    success = await crud.delete_article(db, article_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to delete article"
@@ -117,10 +232,10 @@ async def delete_article(
 async def update_article(
     article: schemas.ArticleUpdate,
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    article_to_update: models.Article = crud.get_article(db, article_id)
+    article_to_update: models.Article = await crud.get_article(db, article_id)
     if article_to_update is None:
         return
     if article.is_deleted is not None:
@@ -148,7 +263,7 @@ async def update_article(
                 detail="no premission to update article",
             )
 
-    success = crud.update_article(db, article_id, article)
+    success = await crud.update_article(db, article_id, article)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to update article"
@@ -159,17 +274,17 @@ async def update_article(
 async def set_article_category(
     category: schemas.CategoryWithName,
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    article: models.Article = crud.get_article(db, article_id)
+    article: models.Article = await crud.get_article(db, article_id)
     if current_member.id != article.writer_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to set article's category",
         )
 
-    success = crud.set_article_category(db, article_id, category)
+    success = await crud.set_article_category(db, article_id, category)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -181,17 +296,17 @@ async def set_article_category(
 async def add_article_tag(
     tag: schemas.TagWithName,
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    article: models.Article = crud.get_article(db, article_id)
+    article: models.Article = await crud.get_article(db, article_id)
     if current_member.id != article.writer_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to add tag to article",
         )
 
-    success = crud.add_article_tag(db, article_id, tag)
+    success = await crud.add_article_tag(db, article_id, tag)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -203,17 +318,17 @@ async def add_article_tag(
 async def remove_article_tag(
     article_id: int = Path(gt=0),
     tag_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    article: models.Article = crud.get_article(db, article_id)
+    article: models.Article = await crud.get_article(db, article_id)
     if current_member.id != article.writer_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to remove tags of article",
         )
 
-    success = crud.remove_article_tag(db, article_id, tag_id)
+    success = await crud.remove_article_tag(db, article_id, tag_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -230,10 +345,24 @@ async def list_article_comments(
     order_by: str = Query("-create_time", pattern="^-?(create_time|like|dislike)$"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
-    db: Session = Depends(get_db),
+    cursor: str = None,
+    with_total: bool = True,
+    db: AsyncSession = Depends(get_db),
 ):
-    comments, total = crud.list_comments(db, article_id, None, order_by, skip, limit)
-    response.headers["X-Total-Count"] = str(total)
+    after = None
+    if cursor is not None:
+        after = utils.decode_cursor(cursor, models.Comment, order_by)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor"
+            )
+    comments, total = await crud.list_comments(
+        db, article_id, None, order_by, skip, limit, after, with_total
+    )
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if len(comments) == limit:
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(comments[-1], order_by)
     return comments
 
 
@@ -241,7 +370,7 @@ async def list_article_comments(
 async def create_article_comment(
     comment: schemas.CommentCreate,
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
     if comment.commenter_name is not None:
@@ -249,7 +378,7 @@ async def create_article_comment(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="member should not set name",
         )
-    result_comment = crud.create_comment(db, article_id, current_member.id, comment)
+    result_comment = await crud.create_comment(db, article_id, current_member.id, comment)
     if result_comment is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to create comment"
@@ -263,14 +392,14 @@ async def create_article_comment(
 async def create_article_comment_for_visitor(
     comment: schemas.CommentCreate,
     article_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if comment.commenter_name is None:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="visitor must set name",
         )
-    result_comment = crud.create_comment(db, article_id, None, comment)
+    result_comment = await crud.create_comment(db, article_id, None, comment)
     if result_comment is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to create comment"
@@ -1,3 +1,4 @@
+from datetime import datetime
 from fastapi import (
     APIRouter,
     Depends,
@@ -7,36 +8,72 @@ from fastapi import (
     Response,
     status,
 )
+from fastapi.responses import StreamingResponse
 
-from sqlalchemy.orm import Session
-from ... import crud, schemas, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from ... import crud, schemas, models, utils
 from ...dependencies.database import get_db
-from ...dependencies.member import get_current_active_member
+from ...dependencies.member import get_current_active_member, get_current_owner
+from ...dependencies.config import get_settings
+from ...config import Settings
+from ...dependencies.comment import get_comment_vote_buffer
 
 router = APIRouter(
     prefix="/comment",
     tags=["comment"],
+    route_class=utils.ModelRoute,
 )
 
 
 @router.get("/", response_model=list[schemas.Comment])
-def list_comments(
+async def list_comments(
     response: Response,
     article_id: int = Query(None, gt=0),
     member_id: int = Query(None, gt=0),
     order_by: str = Query("-create_time", pattern="^-?(create_time|like|dislike)$"),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
-    db: Session = Depends(get_db),
+    cursor: str = None,
+    with_total: bool = True,
+    db: AsyncSession = Depends(get_db),
 ):
-    comments, total = crud.list_comments(db, article_id, member_id, order_by, skip, limit)
-    response.headers["X-Total-Count"] = str(total)
+    after = None
+    if cursor is not None:
+        after = utils.decode_cursor(cursor, models.Comment, order_by)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor"
+            )
+    comments, total = await crud.list_comments(
+        db, article_id, member_id, order_by, skip, limit, after, with_total
+    )
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    if len(comments) == limit:
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(comments[-1], order_by)
     return comments
 
 
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(get_current_owner)],
+)
+async def export_comments(
+    updated_since: datetime = None,
+    db: AsyncSession = Depends(get_db),
+    setting: Settings = Depends(get_settings),
+):
+    batches = crud.stream_comments(db, updated_since, setting.export_batch_size)
+    return StreamingResponse(
+        utils.encode_ndjson(batches, schemas.CommentExport),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/{comment_id}", response_model=schemas.Comment)
-def get_comment(comment_id: int = Path(gt=0), db: Session = Depends(get_db)):
-    result_comment = crud.get_comment(db, comment_id)
+async def get_comment(comment_id: int = Path(gt=0), db: AsyncSession = Depends(get_db)):
+    result_comment = await crud.get_comment(db, comment_id)
     if result_comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="comment not found"
@@ -45,12 +82,12 @@ def get_comment(comment_id: int = Path(gt=0), db: Session = Depends(get_db)):
 
 
 @router.delete("/{comment_id}")
-def delete_comment(
+async def delete_comment(
     comment_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    comment = crud.get_comment(db, comment_id)
+    comment = await crud.get_comment(db, comment_id)
     if comment is None:
         return
     if (
@@ -61,7 +98,7 @@ def delete_comment(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no permission to delete comment",
         )
-    success = crud.delete_comment(db, comment_id)
+    success = await crud.delete_comment(db, comment_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to delete comment"
@@ -69,13 +106,13 @@ def delete_comment(
 
 
 @router.patch("/{comment_id}")
-def update_comment(
+async def update_comment(
     comment: schemas.CommentUpdate,
     comment_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    comment_to_update = crud.get_comment(db, comment_id)
+    comment_to_update = await crud.get_comment(db, comment_id)
     if comment is None:
         return
     if (
@@ -86,7 +123,7 @@ def update_comment(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to update comment",
         )
-    success = crud.update_comment(db, comment_id, comment)
+    success = await crud.update_comment(db, comment_id, comment)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to update comment"
@@ -94,11 +131,15 @@ def update_comment(
 
 
 @router.post("/{comment_id}/like")
-def add_comment_like(
+async def add_comment_like(
     comment_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    vote_buffer: crud.CommentVoteBuffer = Depends(get_comment_vote_buffer),
 ):
-    success = crud.add_comment_like(db, comment_id)
+    if vote_buffer is not None:
+        vote_buffer.add(comment_id, like=1)
+        return
+    success = await crud.add_comment_like(db, comment_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -107,11 +148,15 @@ def add_comment_like(
 
 
 @router.post("/{comment_id}/dislike")
-def add_comment_dislike(
+async def add_comment_dislike(
     comment_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    vote_buffer: crud.CommentVoteBuffer = Depends(get_comment_vote_buffer),
 ):
-    success = crud.add_comment_dislike(db, comment_id)
+    if vote_buffer is not None:
+        vote_buffer.add(comment_id, dislike=1)
+        return
+    success = await crud.add_comment_dislike(db, comment_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, Query, Path, HTTPException, status
 
-from sqlalchemy.orm import Session
-from ... import crud, schemas, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from ... import crud, schemas, models, utils
 from ...dependencies.database import get_db
 from ...dependencies.member import get_current_active_member
 
 router = APIRouter(
     prefix="/member",
     tags=["member"],
+    route_class=utils.ModelRoute,
 )
 
 
@@ -18,9 +19,9 @@ async def list_members(
     is_active: bool = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    members = crud.list_members(db, name_like, role, is_active, skip, limit)
+    members = await crud.list_members(db, name_like, role, is_active, skip, limit)
     return members
 
 
@@ -32,8 +33,8 @@ async def get_current_member(
 
 
 @router.get("/{member_id}", response_model=schemas.Member)
-async def get_member_by_id(member_id: int = Path(gt=0), db: Session = Depends(get_db)):
-    result_member = crud.get_member(db, member_id)
+async def get_member_by_id(member_id: int = Path(gt=0), db: AsyncSession = Depends(get_db)):
+    result_member = await crud.get_member(db, member_id)
     if result_member is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="member not found"
@@ -47,9 +48,9 @@ async def get_member_by_id(member_id: int = Path(gt=0), db: Session = Depends(ge
     dependencies=[Depends(get_current_active_member)],
 )
 async def get_member_by_name(
-    member_name: str = Path(min_length=1, max_length=20), db: Session = Depends(get_db)
+    member_name: str = Path(min_length=1, max_length=20), db: AsyncSession = Depends(get_db)
 ):
-    result_member = crud.get_member_by_name(db, member_name)
+    result_member = await crud.get_member_by_name(db, member_name)
     if result_member is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="member not found"
@@ -60,7 +61,7 @@ async def get_member_by_name(
 @router.post("/", response_model=schemas.Member)
 async def create_member(
     member: schemas.MemberCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
     if (
@@ -75,11 +76,11 @@ async def create_member(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to create member with that role",
         )
-    if crud.get_member_by_name(db, member.name) is not None:
+    if await crud.get_member_by_name(db, member.name) is not None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="name already exist"
         )
-    member_created = crud.create_member(db, member)
+    member_created = await crud.create_member(db, member)
     if member_created is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to create member"
@@ -91,10 +92,10 @@ async def create_member(
 async def update_member(
     member: schemas.MemberUpdate,
     member_id: int = Path(gt=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_member: models.Member = Depends(get_current_active_member),
 ):
-    member_to_update = crud.get_member(db, member_id)
+    member_to_update = await crud.get_member(db, member_id)
     if (
         current_member.id != member_id
         and (
@@ -113,7 +114,7 @@ async def update_member(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="no premission to update member info",
         )
-    success = crud.update_member(db, member_id, member)
+    success = await crud.update_member(db, member_id, member)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to update member"
@@ -1,25 +1,30 @@
-from fastapi import APIRouter, Depends, Path, HTTPException, status, Body
+from fastapi import APIRouter, Depends, Path, HTTPException, Query, status, Body
 
-from sqlalchemy.orm import Session
-from ... import crud, schemas
+from sqlalchemy.ext.asyncio import AsyncSession
+from ... import crud, schemas, utils
 from ...dependencies.database import get_db
 from ...dependencies.member import get_current_active_member
 
 router = APIRouter(
     prefix="/tag",
     tags=["tag"],
+    route_class=utils.ModelRoute,
 )
 
 
 @router.get("/", response_model=list[schemas.Tag])
-async def list_tags(hide_unused: bool = False, db: Session = Depends(get_db)):
-    tags = crud.list_tags(db, hide_unused)
+async def list_tags(
+    hide_unused: bool = False,
+    order_by: str = Query("id", pattern="^-?(id|name|article_count)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    tags = await crud.list_tags(db, hide_unused, order_by)
     return tags
 
 
 @router.get("/{tag_id}", response_model=schemas.Tag)
-async def get_tag(tag_id: int = Path(gt=0), db: Session = Depends(get_db)):
-    result_tag = crud.get_tag(db, tag_id)
+async def get_tag(tag_id: int = Path(gt=0), db: AsyncSession = Depends(get_db)):
+    result_tag = await crud.get_tag(db, tag_id)
     if result_tag is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="tag not found"
@@ -32,12 +37,12 @@ async def get_tag(tag_id: int = Path(gt=0), db: Session = Depends(get_db)):
     response_model=schemas.Tag,
     dependencies=[Depends(get_current_active_member)],
 )
-async def create_tag(tag: schemas.TagCreate, db: Session = Depends(get_db)):
-    if crud.get_tag_by_name(db, tag.name) is not None:
+async def create_tag(tag: schemas.TagCreate, db: AsyncSession = Depends(get_db)):
+    if await crud.get_tag_by_name(db, tag.name) is not None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="tag already exist"
         )
-    tag_created = crud.create_tag(db, tag)
+    tag_created = await crud.create_tag(db, tag)
     if tag_created is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to create tag"
@@ -46,8 +51,8 @@ async def create_tag(tag: schemas.TagCreate, db: Session = Depends(get_db)):
 
 
 @router.delete("/{tag_id}", dependencies=[Depends(get_current_active_member)])
-async def delete_tag(tag_id: int = Path(gt=0), db: Session = Depends(get_db)):
-    success = crud.delete_tag(db, tag_id)
+async def delete_tag(tag_id: int = Path(gt=0), db: AsyncSession = Depends(get_db)):
+    success = await crud.delete_tag(db, tag_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="fail to delete tag"
@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
 from . import tag, comment
-from .category import Category
+from .category import CategoryForArticle
 
 
 class WriterInfo(BaseModel):
@@ -16,8 +16,8 @@ class Article(BaseModel):
     create_time: datetime
     update_time: datetime
     is_deleted: bool = False
-    category: Category | None = None
-    tags: list[tag.Tag] = []
+    category: CategoryForArticle | None = None
+    tags: list[tag.TagForArticle] = []
     writer: WriterInfo
 
     model_config = ConfigDict(from_attributes=True)
@@ -29,8 +29,9 @@ class ArticleSimplify(BaseModel):
     create_time: datetime
     update_time: datetime
     is_deleted: bool = False
-    category: Category | None = None
-    tags: list[tag.Tag] = []
+    comment_count: int = 0
+    category: CategoryForArticle | None = None
+    tags: list[tag.TagForArticle] = []
     writer: WriterInfo
 
     model_config = ConfigDict(from_attributes=True)
@@ -47,3 +48,21 @@ class ArticleUpdate(BaseModel):
     title: str = Field(None, min_length=1, max_length=50)
     content: str = None
     is_deleted: bool = None
+
+
+class ArticleImportResult(BaseModel):
+    line: int
+    id: int | None = None
+    error: str | None = None
+
+
+class ArticleExport(BaseModel):
+    id: int
+    title: str
+    content: str
+    create_time: datetime
+    update_time: datetime
+    is_deleted: bool
+    writer_id: int | None
+    category: str | None = None
+    tags: list[str] = []
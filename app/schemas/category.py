@@ -7,6 +7,13 @@ class CategoryBase(BaseModel):
 
 class Category(CategoryBase):
     id: int = Field(gt=0)
+    article_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CategoryForArticle(CategoryBase):
+    id: int = Field(gt=0)
 
     model_config = ConfigDict(from_attributes=True)
 
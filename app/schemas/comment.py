@@ -28,3 +28,15 @@ class CommentCreate(BaseModel):
 
 class CommentUpdate(BaseModel):
     content: str = Field(None, max_length=250)
+
+
+class CommentExport(BaseModel):
+    id: int
+    content: str
+    commenter_name: str | None
+    like: int
+    dislike: int
+    create_time: datetime
+    update_time: datetime | None
+    article_id: int | None
+    member_id: int | None
@@ -7,6 +7,13 @@ class TagBase(BaseModel):
 
 class Tag(TagBase):
     id: int = Field(gt=0)
+    article_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TagForArticle(TagBase):
+    id: int = Field(gt=0)
 
     model_config = ConfigDict(from_attributes=True)
 
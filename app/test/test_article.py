@@ -1,4 +1,15 @@
-from .utils import login, create_client
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import update
+
+from .utils import login, create_client, get_dialect, record_statements
+from .. import crud, models
+from ..config import Settings
+from ..dependencies.config import get_settings
+from ..dependencies.database import get_db
+from ..main import app
 
 
 def test_create_article():
@@ -502,3 +513,571 @@ def test_remove_article_tag():
     assert response.status_code == 200
     assert response.json()["title"] == "a1"
     assert response.json()["tags"] == []
+
+
+def test_search_article():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    for title, content in [
+        ("a1", "fastapi makes writing web apis pleasant"),
+        ("a2", "sqlite ships a full text search engine"),
+        ("fastapi tips", "notes about dependencies"),
+    ]:
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": title, "content": content},
+        )
+        assert response.status_code == 200
+
+    response = client.get("/api/v1/article", params={"q": "fastapi"})
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "2"
+    assert {article["title"] for article in response.json()} == {"a1", "fastapi tips"}
+
+    response = client.get("/api/v1/article", params={"q": "full search"})
+    assert response.status_code == 200
+    assert [article["title"] for article in response.json()] == ["a2"]
+
+    response = client.get("/api/v1/article", params={"q": '"unbalanced'})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    # content_has goes through the same index, scoped to the content column
+    response = client.get("/api/v1/article", params={"content_has": "fastapi"})
+    assert [article["title"] for article in response.json()] == ["a1"]
+    response = client.get(
+        "/api/v1/article", params={"content_has": "search engine", "q": "sqlite"}
+    )
+    assert [article["title"] for article in response.json()] == ["a2"]
+    response = client.get("/api/v1/article", params={"content_has": "fast"})
+    assert response.json() == []
+
+    response = client.patch(
+        "/api/v1/article/2",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"content": "now it is about postgres"},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/article", params={"q": "sqlite"})
+    assert response.json() == []
+    response = client.get("/api/v1/article", params={"q": "postgres"})
+    assert [article["title"] for article in response.json()] == ["a2"]
+
+    response = client.patch(
+        "/api/v1/article/2",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"is_deleted": True},
+    )
+    assert response.status_code == 200
+    response = client.delete(
+        "/api/v1/article/2", headers={"Authorization": f"Bearer {jwt}"}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/article", params={"q": "postgres"})
+    assert response.json() == []
+
+
+def test_list_articles_with_cursor():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    for title in ["a3", "a1", "a5", "a2", "a4"]:
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": title},
+        )
+        assert response.status_code == 200
+
+    for order_by, expect in [
+        ("title", ["a1", "a2", "a3", "a4", "a5"]),
+        ("-title", ["a5", "a4", "a3", "a2", "a1"]),
+        ("-create_time", ["a4", "a2", "a5", "a1", "a3"]),
+    ]:
+        titles = []
+        params = {"order_by": order_by, "limit": 2}
+        while True:
+            response = client.get("/api/v1/article", params=params)
+            assert response.status_code == 200
+            assert response.headers["X-Total-Count"] == "5"
+            titles += [article["title"] for article in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert titles == expect
+
+    response = client.get("/api/v1/article", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+def test_list_articles_query_count():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    for i in range(6):
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": f"a{i}", "tags": [f"t{i}", "common"], "category": f"c{i}"},
+        )
+        assert response.status_code == 200
+
+    with record_statements() as statements:
+        query_counts = []
+        for limit in [1, 3, 6]:
+            statements.clear()
+            response = client.get("/api/v1/article", params={"limit": limit})
+            assert response.status_code == 200
+            assert len(response.json()) == limit
+            for article in response.json():
+                assert article["writer"]["name"] == "Owner"
+                assert len(article["tags"]) == 2
+                assert article["category"] is not None
+            query_counts.append(len(statements))
+
+    assert query_counts[0] == query_counts[1] == query_counts[2]
+
+
+def test_list_articles_total():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.get("/api/v1/article")
+    assert response.headers["X-Total-Count"] == "0"
+
+    for title in ["a1", "a2", "a3"]:
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": title},
+        )
+        assert response.status_code == 200
+
+        # the cached total is dropped by every write
+        response = client.get("/api/v1/article")
+        assert response.headers["X-Total-Count"] == title[1]
+
+    response = client.get("/api/v1/article", params={"skip": 5})
+    assert response.json() == []
+    assert response.headers["X-Total-Count"] == "3"
+
+    response = client.get("/api/v1/article", params={"with_total": False})
+    assert len(response.json()) == 3
+    assert "X-Total-Count" not in response.headers
+
+    response = client.get("/api/v1/article", params={"is_deleted": True})
+    assert response.headers["X-Total-Count"] == "0"
+
+    response = client.patch(
+        "/api/v1/article/1",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"is_deleted": True},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/article", params={"is_deleted": True})
+    assert response.headers["X-Total-Count"] == "1"
+
+
+def test_get_article_not_modified():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "a1", "content": "hello", "tags": ["t1"]},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/article/1")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/article/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    response = client.get(
+        "/api/v1/article/1", headers={"If-None-Match": f'"other", W/{etag}'}
+    )
+    assert response.status_code == 304
+
+    # every change of the representation yields a new etag
+    for method, url, body in [
+        ("put", "/api/v1/article/1/tag", {"name": "t2"}),
+        ("put", "/api/v1/article/1/category", {"name": "c1"}),
+        ("patch", "/api/v1/article/1", {"content": "hello again"}),
+        ("delete", "/api/v1/tag/1", None),
+    ]:
+        response = client.request(
+            method, url, headers={"Authorization": f"Bearer {jwt}"}, json=body
+        )
+        assert response.status_code == 200
+
+        response = client.get("/api/v1/article/1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        etag = response.headers["ETag"]
+
+    response = client.get("/api/v1/article/2", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+
+def test_server_timing():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "a1", "tags": ["t1"]},
+    )
+    assert response.status_code == 200
+
+    with record_statements() as statements:
+        response = client.get("/api/v1/article")
+
+    metrics = {}
+    for metric in response.headers["Server-Timing"].split(","):
+        name, *params = metric.strip().split(";")
+        metrics[name] = dict(param.split("=") for param in params)
+    assert set(metrics) == {"db", "db-count", "app"}
+    assert metrics["db-count"]["desc"] == f'"{len(statements)}"'
+    assert float(metrics["db"]["dur"]) > 0
+    assert float(metrics["app"]["dur"]) > 0
+
+
+@pytest.mark.parametrize("returning", [True, False])
+def test_bulk_create_articles(returning, monkeypatch):
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    # mysql can not return rows from a multi-row insert
+    monkeypatch.setattr(get_dialect(), "insert_executemany_returning", returning)
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "existing", "tags": ["t1"]},
+    )
+    assert response.status_code == 200
+
+    lines = [
+        json.dumps({"title": "a1", "content": "c1", "tags": ["t1", "t2"]}),
+        json.dumps({"title": "a2", "tags": ["t2", "t3"], "category": "c1"}),
+        "",
+        json.dumps({"title": "existing"}),
+        "not json",
+        json.dumps({"title": "a1"}),
+        json.dumps({"title": "a3", "category": "c1"}),
+    ]
+    body = "\n".join(lines).encode()
+
+    response = client.post("/api/v1/article/bulk", content=body)
+    assert response.status_code == 401
+
+    response = client.post(
+        "/api/v1/article/bulk",
+        headers={"Authorization": f"Bearer {jwt}"},
+        content=body,
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["line"] for result in results] == [1, 2, 4, 5, 6, 7]
+    assert [result["id"] is not None for result in results] == [
+        True,
+        True,
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert results[2]["error"] == "article title already exist"
+    assert results[3]["error"].startswith("invalid article")
+    assert results[4]["error"] == "article title already exist"
+
+    response = client.get(f"/api/v1/article/{results[1]['id']}")
+    assert response.status_code == 200
+    article = response.json()
+    assert article["title"] == "a2"
+    assert article["category"]["name"] == "c1"
+    assert sorted(tag["name"] for tag in article["tags"]) == ["t2", "t3"]
+    assert article["writer"]["name"] == "Owner"
+
+    response = client.get(f"/api/v1/article/{results[0]['id']}")
+    assert response.json()["content"] == "c1"
+    assert sorted(tag["name"] for tag in response.json()["tags"]) == ["t1", "t2"]
+
+    tag_id = next(tag["id"] for tag in article["tags"] if tag["name"] == "t2")
+    response = client.get("/api/v1/article", params={"tag_ids": [tag_id]})
+    assert response.headers["X-Total-Count"] == "2"
+    response = client.get("/api/v1/tag")
+    assert len(response.json()) == 3
+    response = client.get("/api/v1/category")
+    assert len(response.json()) == 1
+
+
+def test_create_article_query_count():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    with record_statements() as statements:
+        query_counts = []
+        for i, tag_count in enumerate([1, 5, 10]):
+            statements.clear()
+            tags = [f"t{i}-{j}" for j in range(tag_count)]
+            response = client.post(
+                "/api/v1/article",
+                headers={"Authorization": f"Bearer {jwt}"},
+                json={"title": f"a{i}", "tags": tags + ["common"], "category": "c"},
+            )
+            assert response.status_code == 200
+            assert len(response.json()["tags"]) == tag_count + 1
+            query_counts.append(len(statements))
+
+    assert query_counts[1] == query_counts[2]
+
+    response = client.put(
+        "/api/v1/article/1/tag",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"name": "common"},
+    )
+    assert response.status_code == 200
+    response = client.put(
+        "/api/v1/article/1/tag",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"name": "t1-0"},
+    )
+    assert response.status_code == 200
+    response = client.get("/api/v1/article/1")
+    assert sorted(tag["name"] for tag in response.json()["tags"]) == [
+        "common",
+        "t0-0",
+        "t1-0",
+    ]
+    response = client.get("/api/v1/tag")
+    assert len(response.json()) == 17
+
+
+def test_export_articles():
+    client = create_client()
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        secret_key="secret_key_for_test", export_batch_size=2
+    )
+    jwt = login(client, "Owner", "12345678")
+
+    for i in range(5):
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={
+                "title": f"a{i}",
+                "content": f"c{i}",
+                "tags": [f"t{i}", "common"],
+                "category": "c" if i % 2 else None,
+            },
+        )
+        assert response.status_code == 200
+
+    response = client.get("/api/v1/article/export")
+    assert response.status_code == 401
+
+    response = client.post(
+        "/api/v1/member",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"name": "member1", "password": "initialpassword"},
+    )
+    assert response.status_code == 200
+    member_jwt = login(client, "member1", "initialpassword")
+    response = client.get(
+        "/api/v1/article/export", headers={"Authorization": f"Bearer {member_jwt}"}
+    )
+    assert response.status_code == 403
+
+    response = client.get(
+        "/api/v1/article/export", headers={"Authorization": f"Bearer {jwt}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    articles = [json.loads(line) for line in response.text.splitlines()]
+    assert [article["id"] for article in articles] == [1, 2, 3, 4, 5]
+    assert articles[1]["content"] == "c1"
+    assert articles[1]["category"] == "c"
+    assert articles[2]["category"] is None
+    assert sorted(articles[3]["tags"]) == ["common", "t3"]
+    assert articles[4]["writer_id"] == 1
+
+    updated_since = articles[3]["update_time"]
+    response = client.get(
+        "/api/v1/article/export",
+        headers={"Authorization": f"Bearer {jwt}"},
+        params={"updated_since": updated_since},
+    )
+    articles = [json.loads(line) for line in response.text.splitlines()]
+    assert all(article["update_time"] >= updated_since for article in articles)
+    assert [article["id"] for article in articles][-2:] == [4, 5]
+
+
+def test_list_articles_without_content():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "a1", "content": "long body"},
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/v1/article/1/comment",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"content": "c1"},
+    )
+    assert response.status_code == 200
+
+    with record_statements() as statements:
+        response = client.get("/api/v1/article")
+        assert response.status_code == 200
+        response = client.get("/api/v1/comment/1")
+        assert response.status_code == 200
+    assert "article.content" not in "".join(statement for statement, _ in statements)
+
+    response = client.get("/api/v1/article/1")
+    assert response.json()["content"] == "long body"
+
+
+def test_list_articles_with_bitmap_index():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    for i in range(6):
+        response = client.post(
+            "/api/v1/article",
+            headers=headers,
+            json={
+                "title": f"a{i}",
+                "tags": ["t1", f"t{i % 2 + 2}"],
+                "category": f"c{i % 3}",
+            },
+        )
+        assert response.status_code == 200
+
+    filters = [
+        {"tag_ids": [1]},
+        {"tag_ids": [1, 2]},
+        {"tag_ids": [2, 3]},
+        {"tag_ids": [1], "category_id": 2},
+        {"tag_ids": [1], "is_deleted": False},
+        {"tag_ids": [1], "is_deleted": True},
+        {"tag_ids": [99]},
+    ]
+
+    def listings():
+        results = []
+        for params in filters:
+            response = client.get("/api/v1/article", params=params)
+            assert response.status_code == 200
+            ids = [article["id"] for article in response.json()]
+            results.append((ids, response.headers["X-Total-Count"]))
+        return results
+
+    def compare():
+        crud.article_bitmap_index.enabled = False
+        expected = listings()
+        crud.article_bitmap_index.enabled = True
+        assert listings() == expected
+        assert crud.article_bitmap_index.loaded
+
+    try:
+        compare()
+
+        response = client.put(
+            "/api/v1/article/1/tag", headers=headers, json={"name": "t3"}
+        )
+        assert response.status_code == 200
+        response = client.delete("/api/v1/article/2/tag/1", headers=headers)
+        assert response.status_code == 200
+        response = client.put(
+            "/api/v1/article/3/category", headers=headers, json={"name": "c2"}
+        )
+        assert response.status_code == 200
+        response = client.patch(
+            "/api/v1/article/4", headers=headers, json={"is_deleted": True}
+        )
+        assert response.status_code == 200
+        response = client.patch(
+            "/api/v1/article/5", headers=headers, json={"is_deleted": True}
+        )
+        assert response.status_code == 200
+        response = client.delete("/api/v1/article/5", headers=headers)
+        assert response.status_code == 200
+        response = client.post(
+            "/api/v1/article",
+            headers=headers,
+            json={"title": "a6", "tags": ["t1", "t2"], "category": "c2"},
+        )
+        assert response.status_code == 200
+        response = client.post(
+            "/api/v1/article/bulk",
+            headers=headers,
+            content=b'{"title": "a7", "tags": ["t2", "t1"]}',
+        )
+        assert response.status_code == 200
+        compare()
+    finally:
+        crud.article_bitmap_index.enabled = False
+
+
+def test_list_articles_from_snapshots():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    response = client.post(
+        "/api/v1/article",
+        headers=headers,
+        json={"title": "a1", "content": "body", "tags": ["t1"], "category": "c1"},
+    )
+    assert response.status_code == 200
+    response = client.put("/api/v1/article/1/tag", headers=headers, json={"name": "t2"})
+    assert response.status_code == 200
+
+    def assert_list_matches_detail():
+        detail = client.get("/api/v1/article/1").json()
+        detail.pop("content")
+        detail["comment_count"] = 0
+        response = client.get("/api/v1/article")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["X-Total-Count"] == "1"
+        assert response.json() == [detail]
+        return detail
+
+    article = assert_list_matches_detail()
+    assert [tag["name"] for tag in article["tags"]] == ["t1", "t2"]
+
+    # renaming the writer rewrites the snapshot without touching update_time
+    response = client.patch("/api/v1/member/1", headers=headers, json={"name": "Owner2"})
+    assert response.status_code == 200
+    renamed = assert_list_matches_detail()
+    assert renamed["writer"]["name"] == "Owner2"
+    assert renamed["update_time"] == article["update_time"]
+
+    async def clear_snapshots():
+        async for db in app.dependency_overrides[get_db]():
+            await db.execute(
+                update(models.Article).values(
+                    snapshot=None, update_time=models.Article.update_time
+                )
+            )
+            await db.commit()
+
+    # rows without a stored snapshot are encoded on the fly
+    asyncio.run(clear_snapshots())
+    assert assert_list_matches_detail() == renamed
@@ -14,7 +14,7 @@ def test_create_category():
         json={"name": "category1"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "category1"}
+    assert responnse.json() == {"id": 1, "name": "category1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/category",
@@ -29,7 +29,7 @@ def test_create_category():
         json={"name": "category2"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "category2"}
+    assert responnse.json() == {"id": 2, "name": "category2", "article_count": 0}
 
 
 def test_get_category():
@@ -41,13 +41,14 @@ def test_get_category():
         json={"name": "category1"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "category1"}
+    assert responnse.json() == {"id": 1, "name": "category1", "article_count": 0}
 
     responnse = client.get("/api/v1/category/1")
     assert responnse.status_code == 200
     assert responnse.json() == {
         "id": 1,
         "name": "category1",
+        "article_count": 0,
     }
 
 
@@ -60,7 +61,7 @@ def test_list_categorys():
         json={"name": "category1"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "category1"}
+    assert responnse.json() == {"id": 1, "name": "category1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/category",
@@ -68,7 +69,7 @@ def test_list_categorys():
         json={"name": "category2"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "category2"}
+    assert responnse.json() == {"id": 2, "name": "category2", "article_count": 0}
 
     responnse = client.get("/api/v1/category")
     assert responnse.status_code == 200
@@ -76,10 +77,12 @@ def test_list_categorys():
         {
             "id": 1,
             "name": "category1",
+            "article_count": 0,
         },
         {
             "id": 2,
             "name": "category2",
+            "article_count": 0,
         },
     ]
 
@@ -107,6 +110,7 @@ def test_list_categorys():
         {
             "id": 1,
             "name": "category1",
+            "article_count": 1,
         },
     ]
 
@@ -120,7 +124,7 @@ def test_delete_category():
         json={"name": "category1"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "category1"}
+    assert responnse.json() == {"id": 1, "name": "category1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/category",
@@ -128,7 +132,7 @@ def test_delete_category():
         json={"name": "category2"},
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "category2"}
+    assert responnse.json() == {"id": 2, "name": "category2", "article_count": 0}
 
     responnse = client.get("/api/v1/category")
     assert responnse.status_code == 200
@@ -136,10 +140,12 @@ def test_delete_category():
         {
             "id": 1,
             "name": "category1",
+            "article_count": 0,
         },
         {
             "id": 2,
             "name": "category2",
+            "article_count": 0,
         },
     ]
 
@@ -154,6 +160,7 @@ def test_delete_category():
         {
             "id": 2,
             "name": "category2",
+            "article_count": 0,
         },
     ]
 
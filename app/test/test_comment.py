@@ -1,4 +1,12 @@
-from .utils import login, create_client
+import asyncio
+import json
+from datetime import datetime
+from contextlib import asynccontextmanager
+from .utils import login, create_client, get_dialect, record_statements
+from .. import crud
+from ..main import app
+from ..dependencies.database import get_db
+from ..dependencies.comment import get_comment_vote_buffer
 
 
 def test_create_comment():
@@ -263,3 +271,246 @@ def test_delete_comment():
 
     response = client.get("/api/v1/comment/3")
     assert response.status_code == 404
+
+
+def test_list_comments_with_cursor():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "article1"},
+    )
+    assert response.status_code == 200
+
+    for i in range(5):
+        response = client.post(
+            "/api/v1/article/1/comment",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"content": f"comment{i}"},
+        )
+        assert response.status_code == 200
+    for _ in range(2):
+        response = client.post("/api/v1/comment/3/like")
+        assert response.status_code == 200
+
+    for url in ["/api/v1/comment", "/api/v1/article/1/comment"]:
+        contents = []
+        params = {"order_by": "-like", "limit": 2}
+        while True:
+            response = client.get(url, params=params)
+            assert response.status_code == 200
+            assert response.headers["X-Total-Count"] == "5"
+            contents += [comment["content"] for comment in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert contents == ["comment2", "comment4", "comment3", "comment1", "comment0"]
+
+    response = client.get("/api/v1/comment", params={"cursor": "e30"})
+    assert response.status_code == 400
+
+
+def test_comment_vote_buffer():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "article1"},
+    )
+    assert response.status_code == 200
+    for content in ["comment1", "comment2"]:
+        response = client.post(
+            "/api/v1/article/1/comment",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"content": content},
+        )
+        assert response.status_code == 200
+
+    session_factory = asynccontextmanager(app.dependency_overrides[get_db])
+    buffer = crud.CommentVoteBuffer(session_factory, interval=60)
+    app.dependency_overrides[get_comment_vote_buffer] = lambda: buffer
+    try:
+        for url in ["1/like", "1/like", "1/dislike", "2/like", "1/like"]:
+            response = client.post(f"/api/v1/comment/{url}")
+            assert response.status_code == 200
+
+        # nothing is written until the buffer is flushed
+        response = client.get("/api/v1/comment/1")
+        assert response.json()["like"] == 0
+
+        asyncio.run(buffer.stop())
+    finally:
+        del app.dependency_overrides[get_comment_vote_buffer]
+
+    response = client.get("/api/v1/comment/1")
+    assert response.json()["like"] == 3
+    assert response.json()["dislike"] == 1
+    response = client.get("/api/v1/comment/2")
+    assert response.json()["like"] == 1
+    assert response.json()["dislike"] == 0
+
+
+def test_comment_vote_buffer_stop_during_flush(monkeypatch):
+    written = {}
+    calls = []
+
+    async def slow_add_comment_votes(db, votes):
+        calls.append(votes)
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        await asyncio.sleep(0.2)
+        written.update(votes)
+        return True
+
+    @asynccontextmanager
+    async def session_factory():
+        yield None
+
+    monkeypatch.setattr(crud.comment, "add_comment_votes", slow_add_comment_votes)
+
+    async def run():
+        buffer = crud.CommentVoteBuffer(session_factory, interval=0.01)
+        buffer.start()
+        buffer.add(1, like=5)
+        # the first flush fails without killing the task, the second one is
+        # still writing when the buffer is stopped
+        await asyncio.sleep(0.1)
+        assert not buffer.task.done()
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert written == {1: (5, 0)}
+    assert buffer.votes == {}
+
+
+def test_export_comments():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "a1"},
+    )
+    assert response.status_code == 200
+    for i in range(3):
+        response = client.post(
+            "/api/v1/article/1/comment",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"content": f"comment{i}"},
+        )
+        assert response.status_code == 200
+
+    response = client.get("/api/v1/comment/export")
+    assert response.status_code == 401
+
+    response = client.get(
+        "/api/v1/comment/export", headers={"Authorization": f"Bearer {jwt}"}
+    )
+    assert response.status_code == 200
+    comments = [json.loads(line) for line in response.text.splitlines()]
+    assert [comment["content"] for comment in comments] == [
+        "comment0",
+        "comment1",
+        "comment2",
+    ]
+    assert comments[0]["article_id"] == 1
+    assert comments[0]["member_id"] == 1
+
+    response = client.get(
+        "/api/v1/comment/export",
+        headers={"Authorization": f"Bearer {jwt}"},
+        params={"updated_since": "2999-01-01T00:00:00"},
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+    # edits and votes reach the incremental export
+    since = datetime.now().isoformat()
+    response = client.patch(
+        "/api/v1/comment/1",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"content": "edited"},
+    )
+    assert response.status_code == 200
+    response = client.post("/api/v1/comment/2/like")
+    assert response.status_code == 200
+    response = client.get(
+        "/api/v1/comment/export",
+        headers={"Authorization": f"Bearer {jwt}"},
+        params={"updated_since": since},
+    )
+    comments = [json.loads(line) for line in response.text.splitlines()]
+    assert [(comment["id"], comment["content"]) for comment in comments] == [
+        (1, "edited"),
+        (2, "comment1"),
+    ]
+
+
+def test_article_comment_count():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    for title in ["a1", "a2"]:
+        response = client.post("/api/v1/article", headers=headers, json={"title": title})
+        assert response.status_code == 200
+    update_time = client.get("/api/v1/article/2").json()["update_time"]
+    for content in ["c1", "c2"]:
+        response = client.post(
+            "/api/v1/article/2/comment", headers=headers, json={"content": content}
+        )
+        assert response.status_code == 200
+    response = client.post(
+        "/api/v1/article/1/comment", headers=headers, json={"content": "c3"}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/article", params={"order_by": "-comment_count"})
+    assert [(a["title"], a["comment_count"]) for a in response.json()] == [
+        ("a2", 2),
+        ("a1", 1),
+    ]
+    # counting comments is not an update of the article
+    assert response.json()[0]["update_time"] == update_time
+
+    response = client.delete("/api/v1/comment/1", headers=headers)
+    assert response.status_code == 200
+    response = client.delete("/api/v1/comment/2", headers=headers)
+    assert response.status_code == 200
+    response = client.get("/api/v1/article", params={"order_by": "-comment_count"})
+    assert [(a["title"], a["comment_count"]) for a in response.json()] == [
+        ("a1", 1),
+        ("a2", 0),
+    ]
+
+
+def test_delete_comment_without_returning(monkeypatch):
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    response = client.post("/api/v1/article", headers=headers, json={"title": "a1"})
+    assert response.status_code == 200
+    for content in ["c1", "c2"]:
+        response = client.post(
+            "/api/v1/article/1/comment", headers=headers, json={"content": content}
+        )
+        assert response.status_code == 200
+
+    # as on mysql, which has no DELETE ... RETURNING
+    monkeypatch.setattr(get_dialect(), "delete_returning", False)
+    with record_statements() as statements:
+        response = client.delete("/api/v1/comment/1", headers=headers)
+        assert response.status_code == 200
+    assert not any("RETURNING" in statement for statement, _ in statements)
+
+    response = client.get("/api/v1/comment/1")
+    assert response.status_code == 404
+    response = client.get("/api/v1/article")
+    assert response.json()[0]["comment_count"] == 1
@@ -0,0 +1,195 @@
+import asyncio
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from .utils import login, create_client
+from .. import crud, database, models
+from ..config import Settings
+from ..database import (
+    Base,
+    ReplicaSet,
+    pool_options,
+    set_sqlite_pragmas,
+    to_async_url,
+)
+from ..dependencies.database import get_db, primary_cookie
+from ..main import app
+
+
+def test_sqlite_pragmas_and_pool(tmp_path):
+    settings = Settings(secret_key="secret_key_for_test", db_pool_size=3)
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_async_engine(
+        to_async_url(url), **pool_options(url, settings, is_async=True)
+    )
+    set_sqlite_pragmas(engine.sync_engine, settings)
+
+    async def pragmas():
+        async with engine.connect() as connection:
+            return [
+                (await connection.exec_driver_sql(f"PRAGMA {name}")).scalar()
+                for name in ["journal_mode", "synchronous", "busy_timeout"]
+            ]
+
+    try:
+        assert asyncio.run(pragmas()) == ["wal", 1, 5000]
+        assert engine.pool.size() == 3
+    finally:
+        asyncio.run(engine.dispose())
+
+    assert pool_options("sqlite://", settings) == {}
+    assert pool_options("sqlite:///:memory:", settings, is_async=True) == {}
+
+
+def test_concurrent_sqlite_writes(tmp_path):
+    settings = Settings(secret_key="secret_key_for_test")
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_async_engine(
+        to_async_url(url), **pool_options(url, settings, is_async=True)
+    )
+    set_sqlite_pragmas(engine.sync_engine, settings)
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def write(i):
+        async with SessionLocal() as db:
+            await db.execute(insert(models.Tag), {"name": f"tag{i}"})
+            await db.commit()
+
+    async def main():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        await asyncio.gather(*(write(i) for i in range(30)))
+        async with SessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(models.Tag))
+
+    try:
+        assert asyncio.run(main()) == 30
+    finally:
+        asyncio.run(engine.dispose())
+
+
+def test_replica_routing(tmp_path, monkeypatch):
+    client = create_client()
+    app.dependency_overrides.pop(get_db)
+    engines = []
+
+    def session_factory(path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        engines.append(engine)
+        return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def create_all():
+        for engine in engines[:2]:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+                await connection.run_sync(models.create_owner_data)
+
+    primary = session_factory(tmp_path / "primary.db")
+    replica = session_factory(tmp_path / "replica.db")
+    broken = session_factory(tmp_path / "missing" / "replica.db")
+    asyncio.run(create_all())
+    monkeypatch.setattr(database, "AsyncSessionLocal", primary)
+    monkeypatch.setattr(database, "replicas", ReplicaSet([replica], cooldown=60))
+
+    try:
+        jwt = login(client, "Owner", "12345678")
+        client.cookies.clear()
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": "written to the primary"},
+        )
+        assert response.status_code == 200
+        assert primary_cookie in response.cookies
+
+        # the writer reads its own write
+        response = client.get("/api/v1/article")
+        assert [article["id"] for article in response.json()] == [1]
+        # everyone else reads the replica, which has not caught up here
+        client.cookies.clear()
+        response = client.get("/api/v1/article")
+        assert response.json() == []
+
+        monkeypatch.setattr(
+            database, "replicas", ReplicaSet([broken, replica], cooldown=60)
+        )
+        for _ in range(3):
+            response = client.get("/api/v1/article")
+            assert response.json() == []
+        assert database.replicas.down_until[0] > 0
+        assert database.replicas.down_until[1] == 0
+
+        # no healthy replica left, reads fall back to the primary
+        monkeypatch.setattr(database, "replicas", ReplicaSet([broken], cooldown=60))
+        response = client.get("/api/v1/article")
+        assert [article["id"] for article in response.json()] == [1]
+    finally:
+        for engine in engines:
+            asyncio.run(engine.dispose())
+
+
+def test_replica_reads_do_not_fill_caches(tmp_path, monkeypatch):
+    client = create_client()
+    app.dependency_overrides.pop(get_db)
+    engines = []
+
+    def session_factory(path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        engines.append(engine)
+        return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def create_all():
+        for engine in engines:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+                await connection.run_sync(models.create_owner_data)
+
+    primary = session_factory(tmp_path / "primary.db")
+    replica = session_factory(tmp_path / "replica.db")
+    asyncio.run(create_all())
+    monkeypatch.setattr(database, "AsyncSessionLocal", primary)
+    monkeypatch.setattr(database, "replicas", ReplicaSet([replica], cooldown=60))
+    monkeypatch.setattr(crud.article_bitmap_index, "enabled", True)
+
+    try:
+        jwt = login(client, "Owner", "12345678")
+        owner = {"Authorization": f"Bearer {jwt}"}
+        response = client.post(
+            "/api/v1/member",
+            headers=owner,
+            json={"name": "m1", "password": "12345678"},
+        )
+        assert response.status_code == 200
+        member_id = response.json()["id"]
+        member = {"Authorization": f"Bearer {login(client, 'm1', '12345678')}"}
+
+        # authentication reads the primary, the replica has not seen m1 yet
+        client.cookies.clear()
+        response = client.get("/api/v1/member/me", headers=member)
+        assert response.status_code == 200
+        response = client.patch(
+            f"/api/v1/member/{member_id}", headers=owner, json={"is_active": False}
+        )
+        assert response.status_code == 200
+        client.cookies.clear()
+        response = client.get("/api/v1/member/me", headers=member)
+        assert response.status_code == 400
+
+        response = client.post(
+            "/api/v1/article", headers=owner, json={"title": "a1", "tags": ["t1"]}
+        )
+        assert response.status_code == 200
+        client.cookies.clear()
+        response = client.get("/api/v1/article", params={"tag_ids": [1]})
+        assert response.headers["X-Total-Count"] == "0"
+        assert not crud.article_bitmap_index.loaded
+
+        # the lagging total and tag index were not kept for the primary reads
+        client.cookies.set(primary_cookie, "1")
+        response = client.get("/api/v1/article", params={"tag_ids": [1]})
+        assert response.headers["X-Total-Count"] == "1"
+        assert crud.article_bitmap_index.loaded
+    finally:
+        crud.article_bitmap_index.clear()
+        for engine in engines:
+            asyncio.run(engine.dispose())
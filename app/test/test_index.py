@@ -0,0 +1,75 @@
+import asyncio
+import re
+
+from .utils import login, create_client, record_statements
+from ..main import app
+from ..dependencies.database import get_db
+
+
+def explain(statements):
+    async def query_plans():
+        db_generator = app.dependency_overrides[get_db]()
+        db = await anext(db_generator)
+        try:
+            connection = await db.connection()
+            plans = []
+            for statement, parameters in statements:
+                result = await connection.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters
+                )
+                plans.append([row[3] for row in result])
+            return plans
+        finally:
+            await db_generator.aclose()
+
+    return asyncio.run(query_plans())
+
+
+def test_listings_use_indexes():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    for i in range(3):
+        response = client.post(
+            "/api/v1/article",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"title": f"a{i}", "tags": ["t1", f"u{i}"], "category": "c1"},
+        )
+        assert response.status_code == 200
+        response = client.post(
+            f"/api/v1/article/{i + 1}/comment",
+            headers={"Authorization": f"Bearer {jwt}"},
+            json={"content": "nice"},
+        )
+        assert response.status_code == 200
+
+    listings = [
+        ("/api/v1/article", {}),
+        ("/api/v1/article", {"order_by": "-update_time"}),
+        ("/api/v1/article", {"order_by": "title"}),
+        ("/api/v1/article", {"is_deleted": False}),
+        ("/api/v1/article", {"is_deleted": False, "order_by": "-update_time"}),
+        ("/api/v1/article", {"category_id": 1}),
+        ("/api/v1/article", {"writer_id": 1}),
+        ("/api/v1/article", {"tag_ids": [1, 2]}),
+        ("/api/v1/article", {"create_time_after": "2000-01-01T00:00:00"}),
+        ("/api/v1/article", {"update_time_after": "2000-01-01T00:00:00"}),
+        ("/api/v1/article", {"q": "a1"}),
+        ("/api/v1/article", {"content_has": "nice"}),
+        ("/api/v1/comment", {}),
+        ("/api/v1/comment", {"member_id": 1}),
+        ("/api/v1/article/1/comment", {}),
+        ("/api/v1/article/1/comment", {"order_by": "-like"}),
+        ("/api/v1/tag", {"order_by": "-article_count"}),
+        ("/api/v1/category", {"order_by": "-article_count"}),
+    ]
+
+    for url, params in listings:
+        with record_statements() as statements:
+            response = client.get(url, params={**params, "with_total": False})
+            assert response.status_code == 200
+
+        for plan in explain(statements):
+            for detail in plan:
+                # a bare "SCAN <table>" reads the whole table without an index
+                assert re.fullmatch(r"SCAN \w+", detail) is None, (url, params, plan)
@@ -1,4 +1,7 @@
+import asyncio
 from .utils import login, create_client
+from .. import crud, utils
+from ..crud import member as crud_member
 
 
 def test_login():
@@ -294,3 +297,73 @@ def test_update_member_by_other():
         "/token", data={"username": "member2", "password": "initialpassword"}
     )
     assert response.status_code == 403
+
+
+def test_password_hasher_busy():
+    hasher = utils.PasswordHasher(max_workers=1, queue_limit=1)
+
+    async def hash_concurrently():
+        return await asyncio.gather(
+            *[hasher.hash("12345678") for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(hash_concurrently())
+    hasher.shutdown()
+    assert sum(isinstance(result, str) for result in results) == 2
+    assert isinstance(results[2], utils.PasswordHasherBusy)
+
+
+def test_login_when_password_hasher_busy(monkeypatch):
+    client = create_client()
+
+    async def busy(*args):
+        raise utils.PasswordHasherBusy()
+
+    monkeypatch.setattr(crud_member, "verify_password_async", busy)
+    response = client.post("/token", data={"username": "Owner", "password": "12345678"})
+    assert response.status_code == 503
+
+
+def test_current_member_cache():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/member",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"name": "member1", "password": "initialpassword"},
+    )
+    assert response.status_code == 200
+    member_jwt = login(client, "member1", "initialpassword")
+
+    hits = crud.member_cache.hits
+    for _ in range(3):
+        response = client.get(
+            "/api/v1/member/me", headers={"Authorization": f"Bearer {member_jwt}"}
+        )
+        assert response.status_code == 200
+        assert response.json()["role"] == "Common Member"
+    assert crud.member_cache.hits >= hits + 2
+
+    # changes made by update_member are seen by the very next request
+    response = client.patch(
+        "/api/v1/member/2",
+        json={"role": "Manager"},
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 200
+    response = client.get(
+        "/api/v1/member/me", headers={"Authorization": f"Bearer {member_jwt}"}
+    )
+    assert response.json()["role"] == "Manager"
+
+    response = client.patch(
+        "/api/v1/member/2",
+        json={"is_active": False},
+        headers={"Authorization": f"Bearer {jwt}"},
+    )
+    assert response.status_code == 200
+    response = client.get(
+        "/api/v1/member/me", headers={"Authorization": f"Bearer {member_jwt}"}
+    )
+    assert response.status_code == 400
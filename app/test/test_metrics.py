@@ -0,0 +1,72 @@
+import re
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from .utils import login, create_client
+from ..main import app
+from ..middleware import MetricsMiddleware
+from ..routers import router, metrics
+
+
+def create_metrics_client():
+    # metrics are opt-in, so mount them on an app sharing the test overrides
+    create_client()
+    metrics_app = FastAPI()
+    metrics_app.add_middleware(MetricsMiddleware)
+    metrics_app.include_router(router)
+    metrics_app.include_router(metrics.router)
+    metrics_app.dependency_overrides = app.dependency_overrides
+    return TestClient(metrics_app)
+
+
+def sample(text, name, **labels):
+    for line in text.splitlines():
+        if line.startswith(name + "{") and all(
+            f'{label}="{value}"' in line for label, value in labels.items()
+        ):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_metrics():
+    client = create_metrics_client()
+    jwt = login(client, "Owner", "12345678")
+
+    response = client.post(
+        "/api/v1/article",
+        headers={"Authorization": f"Bearer {jwt}"},
+        json={"title": "a1"},
+    )
+    assert response.status_code == 200
+    for article_id in [1, 1, 2]:
+        client.get(f"/api/v1/article/{article_id}")
+    client.get("/not/a/route")
+    for _ in range(2):
+        client.get("/api/v1/member/me", headers={"Authorization": f"Bearer {jwt}"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+
+    route = "/api/v1/article/{article_id}"
+    assert sample(text, "wblog_http_requests_total", route=route, status="200") == 2
+    assert sample(text, "wblog_http_requests_total", route=route, status="404") == 1
+    assert sample(text, "wblog_http_request_duration_seconds_count", route=route) == 3
+    assert (
+        sample(
+            text, "wblog_http_request_duration_seconds_bucket", route=route, le="+Inf"
+        )
+        == 3
+    )
+    assert (
+        sample(text, "wblog_http_requests_total", route="unmatched", status="404")
+        == 1
+    )
+    # the scrape itself is in flight while it renders
+    assert sample(text, "wblog_http_requests_in_progress", method="GET") == 1
+    assert sample(text, "wblog_member_cache_hits_total") >= 1
+    assert "# TYPE wblog_db_pool_checkout_wait_seconds histogram" in text
+
+    for line in text.splitlines():
+        assert re.fullmatch(r"# (HELP|TYPE) .+|\w+\{.*\} -?[\d.e+-]+", line), line
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from fastapi import APIRouter, FastAPI, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, ConfigDict
+
+from .utils import login, create_client
+from .. import schemas, utils
+
+
+class Item(BaseModel):
+    id: int
+    tags: list[str] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def test_model_route():
+    router = APIRouter(route_class=utils.ModelRoute)
+
+    @router.get("/items", response_model=list[Item], status_code=201)
+    async def list_items(response: Response):
+        response.headers["X-Total-Count"] = "2"
+        return [SimpleNamespace(id=1, tags=["a"]), SimpleNamespace(id=2, tags=[])]
+
+    @router.get("/raw")
+    def raw():
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    response = client.get("/items")
+    assert response.status_code == 201
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == b'[{"id":1,"tags":["a"]},{"id":2,"tags":[]}]'
+    response = client.get("/raw")
+    assert response.json() == {"ok": True}
+    # routes without a response_model get the orjson response class as well
+    raw_route = next(route for route in app.routes if route.path == "/raw")
+    assert raw_route.response_class.value is utils.ModelJSONResponse
+
+    # the response_model still documents the route
+    schema = app.openapi()["paths"]["/items"]["get"]["responses"]["201"]
+    assert "items" in schema["content"]["application/json"]["schema"]
+
+
+def test_fast_json_response_matches_response_model():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+    response = client.post(
+        "/api/v1/article", headers=headers, json={"title": "a1", "tags": ["t1"]}
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/v1/article/1/comment", headers=headers, json={"content": "c1"}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/comment")
+    comments = [schemas.Comment.model_validate(item) for item in response.json()]
+    assert response.json() == jsonable_encoder(comments)
+    assert response.headers["X-Total-Count"] == "1"
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+from ..database import schema_version
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_python(tmp_path, *args):
+    env = {
+        **os.environ,
+        "PYTHONPATH": root,
+        "SECRET_KEY": "secret_key_for_test",
+        "DB_DATABASE": str(tmp_path / "app.db"),
+    }
+    return subprocess.run(
+        [sys.executable, *args], cwd=tmp_path, env=env, capture_output=True, text=True
+    )
+
+
+lifespan_script = """
+from fastapi.testclient import TestClient
+from app.main import app
+
+with TestClient(app) as client:
+    print(client.get("/api/v1/member/1").json()["name"])
+"""
+
+
+import_script = """
+import sys
+
+from passlib.context import CryptContext
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import Engine
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("import ran startup work")
+
+
+# the cold start cost was schema creation and hashing the owner password
+CryptContext.hash = fail
+MetaData.create_all = fail
+event.listen(Engine, "connect", fail)
+event.listen(Engine, "before_cursor_execute", fail)
+# pyroaring is only needed once the article bitmap index is enabled
+sys.modules["pyroaring"] = None
+
+import app.main
+"""
+
+
+def test_import_does_not_touch_database(tmp_path):
+    result = run_python(tmp_path, "-c", import_script)
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / "app.db").exists()
+
+
+def test_lifespan_requires_init_db(tmp_path):
+    result = run_python(tmp_path, "-c", lifespan_script)
+    assert result.returncode != 0
+    assert "python -m app init-db" in result.stderr
+
+    result = run_python(tmp_path, "-m", "app", "init-db")
+    assert result.returncode == 0, result.stderr
+    # running it again upgrades nothing and keeps the single owner
+    result = run_python(tmp_path, "-m", "app", "init-db")
+    assert result.returncode == 0, result.stderr
+    with sqlite3.connect(tmp_path / "app.db") as connection:
+        assert connection.execute("SELECT name FROM member").fetchall() == [("Owner",)]
+        versions = connection.execute("SELECT version FROM schema_version")
+        assert versions.fetchall() == [(schema_version,)]
+
+    result = run_python(tmp_path, "-c", lifespan_script)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "Owner"
+
+
+def test_count_comments(tmp_path):
+    result = run_python(tmp_path, "-m", "app", "init-db")
+    assert result.returncode == 0, result.stderr
+    with sqlite3.connect(tmp_path / "app.db") as connection:
+        connection.executemany(
+            "INSERT INTO article (id, title, content, create_time, update_time, "
+            "is_deleted, writer_id, comment_count) VALUES (?, ?, '', "
+            "'2020-01-01 00:00:00', '2020-01-01 00:00:00', 0, 1, ?)",
+            [(1, "a1", 5), (2, "a2", 0), (3, "a3", 0)],
+        )
+        connection.executemany(
+            "INSERT INTO comment (content, article_id, like, dislike, create_time) "
+            "VALUES ('c', ?, 0, 0, '2020-01-01 00:00:00')",
+            [(2,), (2,), (3,)],
+        )
+
+    result = run_python(tmp_path, "-m", "app", "count-comments")
+    assert result.returncode == 0, result.stderr
+    assert "fixed the comment count of 3 articles" in result.stdout
+    with sqlite3.connect(tmp_path / "app.db") as connection:
+        rows = connection.execute(
+            "SELECT id, comment_count, update_time, snapshot FROM article"
+        ).fetchall()
+    assert [row[:3] for row in rows] == [
+        (1, 0, "2020-01-01 00:00:00"),
+        (2, 2, "2020-01-01 00:00:00"),
+        (3, 1, "2020-01-01 00:00:00"),
+    ]
+    assert '"comment_count":2' in rows[1][3]
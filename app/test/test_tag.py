@@ -1,4 +1,8 @@
+from sqlalchemy import create_engine
+
 from .utils import login, create_client
+from .. import models
+from ..database import Base, add_missing_columns, create_missing_indexes
 
 
 def test_create_tag():
@@ -12,7 +16,7 @@ def test_create_tag():
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag1"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "tag1"}
+    assert responnse.json() == {"id": 1, "name": "tag1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag1"}
@@ -23,7 +27,7 @@ def test_create_tag():
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag2"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "tag2"}
+    assert responnse.json() == {"id": 2, "name": "tag2", "article_count": 0}
 
 
 def test_get_tag():
@@ -33,13 +37,14 @@ def test_get_tag():
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag1"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "tag1"}
+    assert responnse.json() == {"id": 1, "name": "tag1", "article_count": 0}
 
     responnse = client.get("/api/v1/tag/1")
     assert responnse.status_code == 200
     assert responnse.json() == {
         "id": 1,
         "name": "tag1",
+        "article_count": 0,
     }
 
 
@@ -50,13 +55,13 @@ def test_list_tags():
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag1"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "tag1"}
+    assert responnse.json() == {"id": 1, "name": "tag1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag2"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "tag2"}
+    assert responnse.json() == {"id": 2, "name": "tag2", "article_count": 0}
 
     responnse = client.get("/api/v1/tag")
     assert responnse.status_code == 200
@@ -64,10 +69,12 @@ def test_list_tags():
         {
             "id": 1,
             "name": "tag1",
+            "article_count": 0,
         },
         {
             "id": 2,
             "name": "tag2",
+            "article_count": 0,
         },
     ]
 
@@ -95,6 +102,7 @@ def test_list_tags():
         {
             "id": 1,
             "name": "tag1",
+            "article_count": 1,
         },
     ]
 
@@ -106,13 +114,13 @@ def test_delete_tag():
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag1"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 1, "name": "tag1"}
+    assert responnse.json() == {"id": 1, "name": "tag1", "article_count": 0}
 
     responnse = client.post(
         "/api/v1/tag", headers={"Authorization": f"Bearer {jwt}"}, json={"name": "tag2"}
     )
     assert responnse.status_code == 200
-    assert responnse.json() == {"id": 2, "name": "tag2"}
+    assert responnse.json() == {"id": 2, "name": "tag2", "article_count": 0}
 
     responnse = client.get("/api/v1/tag")
     assert responnse.status_code == 200
@@ -120,10 +128,12 @@ def test_delete_tag():
         {
             "id": 1,
             "name": "tag1",
+            "article_count": 0,
         },
         {
             "id": 2,
             "name": "tag2",
+            "article_count": 0,
         },
     ]
 
@@ -138,6 +148,7 @@ def test_delete_tag():
         {
             "id": 2,
             "name": "tag2",
+            "article_count": 0,
         },
     ]
 
@@ -154,3 +165,103 @@ def test_delete_tag():
     responnse = client.get("/api/v1/tag")
     assert responnse.status_code == 200
     assert responnse.json() == []
+
+
+def test_tag_article_count():
+    client = create_client()
+    jwt = login(client, "Owner", "12345678")
+    headers = {"Authorization": f"Bearer {jwt}"}
+
+    for i, tags in enumerate([["t1", "t2"], ["t1"], ["t1", "t3"]]):
+        responnse = client.post(
+            "/api/v1/article",
+            headers=headers,
+            json={"title": f"a{i}", "tags": tags, "category": "c1"},
+        )
+        assert responnse.status_code == 200
+    responnse = client.post(
+        "/api/v1/article/bulk",
+        headers=headers,
+        content=b'{"title": "b1", "tags": ["t2", "t3"], "category": "c2"}',
+    )
+    assert responnse.status_code == 200
+
+    def counts(url):
+        responnse = client.get(url, params={"order_by": "-article_count"})
+        assert responnse.status_code == 200
+        return [(item["name"], item["article_count"]) for item in responnse.json()]
+
+    assert counts("/api/v1/tag") == [("t1", 3), ("t3", 2), ("t2", 2)]
+    assert counts("/api/v1/category") == [("c1", 3), ("c2", 1)]
+
+    # adding an existing tag twice counts it once
+    for _ in range(2):
+        responnse = client.put(
+            "/api/v1/article/2/tag", headers=headers, json={"name": "t2"}
+        )
+        assert responnse.status_code == 200
+    responnse = client.delete("/api/v1/article/1/tag/1", headers=headers)
+    assert responnse.status_code == 200
+    responnse = client.delete("/api/v1/article/1/tag/1", headers=headers)
+    assert responnse.status_code == 200
+    responnse = client.put(
+        "/api/v1/article/3/category", headers=headers, json={"name": "c2"}
+    )
+    assert responnse.status_code == 200
+    # ties are broken by the newest id
+    assert counts("/api/v1/tag") == [("t2", 3), ("t3", 2), ("t1", 2)]
+    assert counts("/api/v1/category") == [("c2", 2), ("c1", 2)]
+
+    responnse = client.patch(
+        "/api/v1/article/2", headers=headers, json={"is_deleted": True}
+    )
+    assert responnse.status_code == 200
+    responnse = client.delete("/api/v1/article/2", headers=headers)
+    assert responnse.status_code == 200
+    assert counts("/api/v1/tag") == [("t3", 2), ("t2", 2), ("t1", 1)]
+    assert counts("/api/v1/category") == [("c2", 2), ("c1", 1)]
+
+    responnse = client.patch(
+        "/api/v1/article/1", headers=headers, json={"is_deleted": True}
+    )
+    assert responnse.status_code == 200
+    responnse = client.delete("/api/v1/article/1", headers=headers)
+    assert responnse.status_code == 200
+    responnse = client.get("/api/v1/tag", params={"hide_unused": True})
+    assert [tag["name"] for tag in responnse.json()] == ["t1", "t2", "t3"]
+    responnse = client.get("/api/v1/category", params={"hide_unused": True})
+    assert [category["name"] for category in responnse.json()] == ["c2"]
+
+
+def test_add_article_count_column(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        for table in ["tag", "category"]:
+            connection.exec_driver_sql(f"DROP INDEX ix_{table}_article_count")
+            connection.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN article_count")
+        connection.exec_driver_sql("INSERT INTO tag (name) VALUES ('t1'), ('t2')")
+        connection.exec_driver_sql("INSERT INTO category (name) VALUES ('c1')")
+        connection.exec_driver_sql(
+            "INSERT INTO article (title, content, create_time, update_time, "
+            "is_deleted, category_id) VALUES "
+            "('a1', '', '2020-01-01', '2020-01-01', 0, 1), "
+            "('a2', '', '2020-01-01', '2020-01-01', 0, NULL)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO article2tag VALUES (1, 1), (2, 1), (2, 2)"
+        )
+
+    with engine.begin() as connection:
+        added = add_missing_columns(connection)
+        assert added == {("tag", "article_count"), ("category", "article_count")}
+        create_missing_indexes(connection)
+        models.count_articles(connection)
+        assert add_missing_columns(connection) == set()
+        tags = connection.exec_driver_sql("SELECT name, article_count FROM tag")
+        assert tags.all() == [("t1", 2), ("t2", 1)]
+        categories = connection.exec_driver_sql(
+            "SELECT name, article_count FROM category"
+        )
+        assert categories.all() == [("c1", 1)]
+    engine.dispose()
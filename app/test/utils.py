@@ -1,8 +1,12 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from .. import crud, models
 from ..database import Base
 from ..main import app
 from ..dependencies.database import get_db
@@ -11,20 +15,30 @@ from ..config import Settings
 
 
 def create_client():
-    engine = create_engine(
-        "sqlite://",
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.create_all(bind=engine)
+    TestingSessionLocal = async_sessionmaker(
+        engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def create_all():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(models.create_owner_data)
+
+    asyncio.run(create_all())
+    # in-process caches must not leak state between test databases
+    crud.article_count_cache.clear()
+    crud.comment_count_cache.clear()
+    crud.member_cache.clear()
+    crud.article_bitmap_index.clear()
 
-    def get_db_override():
-        try:
-            db = TestingSessionLocal()
+    async def get_db_override():
+        async with TestingSessionLocal() as db:
             yield db
-        finally:
-            db.close()
 
     def get_settings_override():
         return Settings(secret_key="secret_key_for_test")
@@ -44,3 +58,28 @@ def login(client, username, password):
     jwt = data.get("access_token")
     assert jwt is not None
     return jwt
+
+
+@contextmanager
+def record_statements():
+    """collect the (statement, parameters) of every sql statement run inside"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+def get_dialect():
+    """the dialect of the test database, shared by every session of the client"""
+
+    async def dialect():
+        async with asynccontextmanager(app.dependency_overrides[get_db])() as db:
+            return db.get_bind().dialect
+
+    return asyncio.run(dialect())
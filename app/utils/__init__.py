@@ -1,3 +1,10 @@
 from .content import *
 from .jwt import *
 from .token import *
+from .pagination import *
+from .cache import *
+from .etag import *
+from .ndjson import *
+from .upsert import *
+from .bitmap import *
+from .response import *
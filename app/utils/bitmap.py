@@ -0,0 +1,114 @@
+def roaring_bitmap():
+    """pyroaring's BitMap, imported on first use so that the native package is
+    only needed where the index is enabled
+    """
+    from pyroaring import BitMap
+
+    return BitMap
+
+
+class ArticleBitmapIndex:
+    """in-process roaring bitmaps of article ids per tag, per category and for
+    deleted articles, so that tag, category and is_deleted filters combine
+    with bitwise operations instead of sql
+    """
+
+    def __init__(self, enabled: bool = False, max_candidates: int = 10000):
+        self.enabled = enabled
+        # larger matches are left to sql, a huge IN list costs more than it saves
+        self.max_candidates = max_candidates
+        self.clear()
+
+    def clear(self):
+        self.loaded = False
+        # bumped by every change, a load racing with a write is thrown away
+        self.version = 0
+        # bitmaps are only created by load, nothing reads them before
+        self.deleted = None
+        self.tags = {}
+        self.categories = {}
+
+    def load(self, articles, links, version: int):
+        """fill the index from (id, category_id, is_deleted) article rows and
+        (article_id, tag_id) link rows read while the index was at `version`
+        """
+        BitMap = roaring_bitmap()
+        deleted = BitMap()
+        tags, categories = {}, {}
+        for article_id, category_id, is_deleted in articles:
+            if is_deleted:
+                deleted.add(article_id)
+            if category_id is not None:
+                categories.setdefault(category_id, BitMap()).add(article_id)
+        for article_id, tag_id in links:
+            tags.setdefault(tag_id, BitMap()).add(article_id)
+        if version != self.version:
+            return False
+        self.deleted, self.tags, self.categories = deleted, tags, categories
+        self.loaded = True
+        return True
+
+    def add_article(
+        self, article_id: int, category_id: int, is_deleted: bool, tag_ids=()
+    ):
+        self.version += 1
+        if not self.loaded:
+            return
+        self.set_deleted(article_id, is_deleted)
+        self.set_category(article_id, None, category_id)
+        for tag_id in tag_ids:
+            self.add_tag(article_id, tag_id)
+
+    def remove_article(self, article_id: int, category_id: int, tag_ids=()):
+        self.version += 1
+        if not self.loaded:
+            return
+        self.deleted.discard(article_id)
+        self.set_category(article_id, category_id, None)
+        for tag_id in tag_ids:
+            self.remove_tag(article_id, tag_id)
+
+    def add_tag(self, article_id: int, tag_id: int):
+        self.version += 1
+        if self.loaded:
+            self.tags.setdefault(tag_id, roaring_bitmap()()).add(article_id)
+
+    def remove_tag(self, article_id: int, tag_id: int):
+        self.version += 1
+        if self.loaded and tag_id in self.tags:
+            self.tags[tag_id].discard(article_id)
+
+    def set_category(self, article_id: int, old_category_id: int, category_id: int):
+        self.version += 1
+        if not self.loaded:
+            return
+        if old_category_id in self.categories:
+            self.categories[old_category_id].discard(article_id)
+        if category_id is not None:
+            self.categories.setdefault(category_id, roaring_bitmap()()).add(article_id)
+
+    def set_deleted(self, article_id: int, is_deleted: bool):
+        self.version += 1
+        if not self.loaded:
+            return
+        if is_deleted:
+            self.deleted.add(article_id)
+        else:
+            self.deleted.discard(article_id)
+
+    def match(
+        self, tag_ids: list[int], category_id: int = None, is_deleted: bool = None
+    ):
+        """the ids of articles having every tag and matching the filters"""
+        BitMap = roaring_bitmap()
+        bitmaps = [self.tags.get(tag_id, BitMap()) for tag_id in tag_ids]
+        if category_id is not None:
+            bitmaps.append(self.categories.get(category_id, BitMap()))
+        if not bitmaps:
+            return BitMap()
+        result = BitMap.intersection(*bitmaps)
+        if is_deleted is True:
+            result &= self.deleted
+        elif is_deleted is False:
+            result -= self.deleted
+        return result
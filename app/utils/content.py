@@ -1,4 +1,8 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from passlib.context import CryptContext
+from ..dependencies.config import get_settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -9,3 +13,63 @@ def verify_password(plain_password: str, hashed_password: str):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """runs bcrypt in its own small thread pool so it never blocks the event loop
+
+    at most `max_workers` tasks run at once and `queue_limit` more may wait,
+    beyond that `PasswordHasherBusy` is raised instead of queueing
+    """
+
+    def __init__(self, max_workers: int, queue_limit: int):
+        self.limit = max_workers + queue_limit
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+
+    async def run(self, fn, *args):
+        if self.pending >= self.limit:
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str):
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str):
+        return await self.run(get_password_hash, password)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+@lru_cache()
+def get_password_hasher():
+    settings = get_settings()
+    return PasswordHasher(
+        settings.password_hash_workers, settings.password_hash_queue_limit
+    )
+
+
+def shutdown_password_hasher():
+    # waits for running hashes, a later call gets a new hasher
+    get_password_hasher().shutdown()
+    get_password_hasher.cache_clear()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await get_password_hasher().verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str):
+    return await get_password_hasher().hash(password)
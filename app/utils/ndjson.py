@@ -0,0 +1,27 @@
+from typing import AsyncIterable
+
+from pydantic import BaseModel
+
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes]):
+    """yield (line number, line) for every non-blank line of a streamed body"""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+
+async def encode_ndjson(batches: AsyncIterable[list], schema: type[BaseModel]):
+    """encode every batch of rows as one chunk of ndjson lines"""
+    async for batch in batches:
+        yield b"".join(
+            schema.model_validate(item).model_dump_json().encode() + b"\n"
+            for item in batch
+        )
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import desc, func, select, tuple_
+
+
+def order_column(model, order_by: str):
+    descending = order_by.startswith("-")
+    return getattr(model, order_by.lstrip("-")), descending
+
+
+def apply_order(query, model, order_by: str, after: tuple = None):
+    """order by `order_by` plus id, and seek past `after` when it is given"""
+    if order_by is None:
+        return query
+    column, descending = order_column(model, order_by)
+    if after is not None:
+        key = tuple_(column, model.id)
+        query = query.filter(key < after if descending else key > after)
+    if descending:
+        return query.order_by(desc(column), desc(model.id))
+    return query.order_by(column, model.id)
+
+
+def encode_cursor(item, order_by: str):
+    value = getattr(item, order_by.lstrip("-"))
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, item.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, model, order_by: str):
+    column, _ = order_column(model, order_by)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, item_id = json.loads(raw)
+        if column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, column.type.python_type):
+            return None
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(item_id, int):
+        return None
+    return value, item_id
+
+
+async def fetch_page(
+    db,
+    page,
+    query,
+    with_total: bool = True,
+    count_cache=None,
+    count_key=None,
+    windowed: bool = True,
+):
+    """return the orm objects of `page` and the number of rows in `query`
+
+    the total is read from `count_cache` when possible. otherwise it rides along
+    with the page as a window function, unless `windowed` is false (the page
+    does not select every row of the query) or the page is empty, in which case
+    a separate count is run
+    """
+    total = None
+    if with_total and count_cache is not None:
+        total = count_cache.get(count_key)
+
+    if with_total and total is None and windowed:
+        rows = (await db.execute(page.add_columns(func.count().over()))).all()
+        items = [row[0] for row in rows]
+        if rows:
+            total = rows[0][1]
+    else:
+        items = (await db.scalars(page)).all()
+
+    if with_total and total is None:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    # a total read from a replica may predate the write that cleared the cache
+    if with_total and count_cache is not None and not db.info.get("replica"):
+        count_cache.set(count_key, total)
+    return items, total
@@ -0,0 +1,73 @@
+import asyncio
+from copy import copy
+
+from fastapi import Response
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute, get_request_handler
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+
+from ..dependencies.config import get_settings
+
+
+class EncodedJSON(str):
+    """json text already produced by a schema, jsonable_encoder returns str
+    instances untouched so it reaches the response class as is
+    """
+
+
+class ModelJSONResponse(ORJSONResponse):
+    """orjson response that sends EncodedJSON content without re-encoding"""
+
+    def render(self, content) -> bytes:
+        if isinstance(content, EncodedJSON):
+            return content.encode()
+        return super().render(content)
+
+
+class ModelRoute(APIRoute):
+    """route validating the endpoint result from attributes and dumping it to
+    json in one pass through a TypeAdapter of its response_model, instead of
+    validating it, converting it with jsonable_encoder and dumping it again.
+    headers and status codes set on the injected Response still apply
+    """
+
+    def get_route_handler(self):
+        if not get_settings().fast_json_response:
+            return super().get_route_handler()
+        if isinstance(self.response_class, DefaultPlaceholder):
+            # routes without a response_model are encoded by orjson too
+            self.response_class = Default(ModelJSONResponse)
+        if self.response_field is None:
+            return super().get_route_handler()
+
+        adapter = TypeAdapter(self.response_model)
+        call = self.dependant.call
+        is_coroutine = asyncio.iscoroutinefunction(call)
+
+        async def encode_result(**values):
+            if is_coroutine:
+                content = await call(**values)
+            else:
+                content = await run_in_threadpool(call, **values)
+            if isinstance(content, (Response, EncodedJSON)):
+                return content
+            # the content comes from our own queries, validation only reads it
+            # into the schema, it can not fail on user input
+            return EncodedJSON(
+                adapter.dump_json(
+                    adapter.validate_python(content, from_attributes=True)
+                ).decode()
+            )
+
+        dependant = copy(self.dependant)
+        dependant.call = encode_result
+        return get_request_handler(
+            dependant=dependant,
+            body_field=self.body_field,
+            status_code=self.status_code,
+            response_class=self.response_class,
+            response_field=None,
+            dependency_overrides_provider=self.dependency_overrides_provider,
+        )
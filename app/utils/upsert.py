@@ -0,0 +1,13 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_ignore(dialect: str, table):
+    """`INSERT ... ON CONFLICT DO NOTHING` for the given dialect name"""
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == "mysql":
+        return insert(table).prefix_with("IGNORE")
+    return insert(table)
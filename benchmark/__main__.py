@@ -0,0 +1,126 @@
+"""time every public route of wblog against seeded sqlite datasets
+
+python -m benchmark --articles 1000 10000 --output results.json
+python -m benchmark --articles 1000 --baseline results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(dataset: dict, baseline: dict = None):
+    print(f"\n{dataset['articles']} articles")
+    print(
+        f"{'scenario':<34}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu ms':>9}"
+        f"{'queries':>9}{'bytes':>10}{'loaded':>10}{'peak mem':>10}"
+        + (f"{'p50 vs base':>13}" if baseline else "")
+    )
+    base_results = {}
+    if baseline is not None:
+        base_results = {result["name"]: result for result in baseline["results"]}
+    for result in dataset["results"]:
+        line = (
+            f"{result['name']:<34}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['cpu_ms_per_request']:>9.2f}"
+            f"{result['queries_per_request']:>9.1f}"
+            f"{result['bytes_per_response']:>10.0f}"
+            f"{result['loaded_bytes_per_request']:>10}{result['peak_memory_bytes']:>10}"
+        )
+        base = base_results.get(result["name"])
+        if base is not None:
+            line += f"{(result['p50_ms'] / base['p50_ms'] - 1) * 100:>+12.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    parser.add_argument("--articles", type=int, nargs="+", default=[1000])
+    parser.add_argument("--comments-per-article", type=int, default=3)
+    parser.add_argument(
+        "--content-words", type=int, default=200, help="words per article body"
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--only", nargs="+", help="run scenarios whose name has any")
+    parser.add_argument(
+        "--workdir", default=os.path.join(tempfile.gettempdir(), "wblog-benchmark")
+    )
+    parser.add_argument("--output", help="write results as json to this file")
+    parser.add_argument("--baseline", help="compare with a previous json output")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    # configure the app before it is imported, so it never touches ./wblog.db
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("DB_DATABASE", os.path.join(args.workdir, "app.db"))
+
+    from app import database
+    from app.cli import init_db
+    from .seed import dataset_version, seed
+    from .runner import run
+
+    # the app lifespan checks the configured database even though the
+    # requests are served from the seeded one
+    init_db(database.engine)
+
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baselines = {
+                dataset["articles"]: dataset for dataset in json.load(f)["datasets"]
+            }
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "iterations": args.iterations,
+        "datasets": [],
+    }
+    for articles in args.articles:
+        path = os.path.join(
+            args.workdir,
+            f"articles-{articles}-{args.comments_per_article}-{args.content_words}"
+            f"-s{database.schema_version}-d{dataset_version}.db",
+        )
+        if not os.path.exists(path):
+            print(f"seeding {articles} articles into {path}", file=sys.stderr)
+            seed(
+                path,
+                articles,
+                args.comments_per_article,
+                content_words=args.content_words,
+            )
+        dataset = {
+            "articles": articles,
+            "comments_per_article": args.comments_per_article,
+            "content_words": args.content_words,
+            "results": run(path, articles, args.iterations, args.only),
+        }
+        report["datasets"].append(dataset)
+        print_results(dataset, baselines.get(articles))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import asyncio
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app import crud
+from app.main import app
+from app.dependencies.database import get_db
+from .seed import member_password
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    url: str
+    params: dict = field(default_factory=dict)
+    data: dict = None
+    auth: bool = False
+    iterations: int = None
+
+
+def scenarios(articles: int):
+    middle = max(articles // 2, 1)
+    return [
+        Scenario("article list", "GET", "/api/v1/article/"),
+        Scenario("article list limit 100", "GET", "/api/v1/article/", {"limit": 100}),
+        Scenario(
+            "article list deep skip",
+            "GET",
+            "/api/v1/article/",
+            {"skip": max(articles - 20, 0)},
+        ),
+        Scenario(
+            "article list is_deleted", "GET", "/api/v1/article/", {"is_deleted": False}
+        ),
+        Scenario(
+            "article list category_id", "GET", "/api/v1/article/", {"category_id": 3}
+        ),
+        Scenario(
+            "article list tag_ids", "GET", "/api/v1/article/", {"tag_ids": [1, 2]}
+        ),
+        Scenario("article list writer_id", "GET", "/api/v1/article/", {"writer_id": 2}),
+        Scenario(
+            "article list title_like", "GET", "/api/v1/article/", {"title_like": "sql"}
+        ),
+        Scenario(
+            "article list content_has",
+            "GET",
+            "/api/v1/article/",
+            {"content_has": "latency throughput"},
+        ),
+        Scenario(
+            "article list content_has rare",
+            "GET",
+            "/api/v1/article/",
+            {"content_has": "topic00007"},
+        ),
+        Scenario("article list q", "GET", "/api/v1/article/", {"q": "latency cache"}),
+        Scenario(
+            "article list create_time range",
+            "GET",
+            "/api/v1/article/",
+            {
+                "create_time_after": "2020-06-01T00:00:00",
+                "create_time_before": "2020-07-01T00:00:00",
+            },
+        ),
+        Scenario(
+            "article list order_by title",
+            "GET",
+            "/api/v1/article/",
+            {"order_by": "title"},
+        ),
+        Scenario(
+            "article list order_by comments",
+            "GET",
+            "/api/v1/article/",
+            {"order_by": "-comment_count"},
+        ),
+        Scenario("article detail", "GET", f"/api/v1/article/{middle}"),
+        Scenario("article comments", "GET", f"/api/v1/article/{middle}/comment"),
+        Scenario("comment list", "GET", "/api/v1/comment/"),
+        Scenario("comment list limit 100", "GET", "/api/v1/comment/", {"limit": 100}),
+        Scenario(
+            "comment list order_by like",
+            "GET",
+            "/api/v1/comment/",
+            {"order_by": "-like"},
+        ),
+        Scenario("comment detail", "GET", "/api/v1/comment/1"),
+        Scenario("tag list", "GET", "/api/v1/tag/"),
+        Scenario("tag list hide_unused", "GET", "/api/v1/tag/", {"hide_unused": True}),
+        Scenario("category list", "GET", "/api/v1/category/"),
+        Scenario(
+            "category list hide_unused",
+            "GET",
+            "/api/v1/category/",
+            {"hide_unused": True},
+        ),
+        Scenario("member list", "GET", "/api/v1/member/"),
+        Scenario("member me", "GET", "/api/v1/member/me", auth=True),
+        Scenario(
+            "login",
+            "POST",
+            "/token",
+            data={"username": "member0", "password": member_password},
+            iterations=10,
+        ),
+    ]
+
+
+def percentile(values: list[float], percent: float):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, "before_cursor_execute", self)
+
+
+class LoadedBytes:
+    """size of the column values the orm loads into instances"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def __call__(self, target, context):
+        for key, value in vars(target).items():
+            if key.startswith("_"):
+                continue
+            if isinstance(value, str):
+                self.bytes += len(value.encode())
+            elif not isinstance(value, (list, tuple)) and not hasattr(
+                value, "__table__"
+            ):
+                self.bytes += sys.getsizeof(value)
+
+    def __enter__(self):
+        event.listen(Mapper, "load", self)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Mapper, "load", self)
+
+
+def override_db(path: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db_override():
+        async with SessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_db_override
+    crud.article_count_cache.clear()
+    crud.comment_count_cache.clear()
+    crud.member_cache.clear()
+    return engine
+
+
+def run_scenario(
+    client: TestClient, scenario: Scenario, headers: dict, iterations: int
+):
+    iterations = scenario.iterations or iterations
+    request_headers = headers if scenario.auth else {}
+
+    def request():
+        response = client.request(
+            scenario.method,
+            scenario.url,
+            params=scenario.params,
+            data=scenario.data,
+            headers=request_headers,
+        )
+        assert response.status_code == 200, (scenario.name, response.text)
+        return response
+
+    for _ in range(min(3, iterations)):
+        request()
+
+    latencies = []
+    response_bytes = 0
+    # every thread of the process, the app runs in the client's event loop thread
+    cpu_start = time.process_time()
+    with QueryCounter() as counter:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = request()
+            latencies.append((time.perf_counter() - start) * 1000)
+            response_bytes += len(response.content)
+    cpu_ms = (time.process_time() - cpu_start) * 1000
+
+    # measured apart from the timed requests, tracing slows everything down
+    tracemalloc.start()
+    try:
+        with LoadedBytes() as loaded:
+            request()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "name": scenario.name,
+        "method": scenario.method,
+        "url": scenario.url,
+        "params": scenario.params,
+        "iterations": iterations,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies),
+        "cpu_ms_per_request": cpu_ms / iterations,
+        "queries_per_request": counter.count / iterations,
+        "bytes_per_response": response_bytes / iterations,
+        "loaded_bytes_per_request": loaded.bytes,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run(path: str, articles: int, iterations: int, only: list[str] = None):
+    engine = override_db(path)
+    try:
+        with TestClient(app) as client:
+            # the lifespan may have loaded it from the configured database
+            crud.article_bitmap_index.clear()
+            response = client.post(
+                "/token", data={"username": "member0", "password": member_password}
+            )
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            results = []
+            for scenario in scenarios(articles):
+                if only and not any(name in scenario.name for name in only):
+                    continue
+                results.append(run_scenario(client, scenario, headers, iterations))
+            return results
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        asyncio.run(engine.dispose())
@@ -0,0 +1,109 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cli import init_db
+from app.crud import refresh_article_snapshots
+from app.utils import get_password_hash
+
+words = (
+    "fastapi sqlite python async database index query cache cursor page "
+    "article comment tag category member writer search token latency "
+    "throughput benchmark server client stream batch commit transaction"
+).split()
+
+member_password = "benchmark1234"
+
+# bumped whenever the generated rows change, cached datasets are keyed by it
+dataset_version = 2
+
+
+def paragraph(rng: random.Random, length: int):
+    return " ".join(rng.choice(words) for _ in range(length))
+
+
+def seed(
+    path: str,
+    articles: int,
+    comments_per_article: int = 3,
+    tags: int = 50,
+    categories: int = 20,
+    members: int = 10,
+    content_words: int = 200,
+    seed: int = 0,
+):
+    """create a sqlite database at `path` filled with a deterministic dataset"""
+    rng = random.Random(seed)
+    topics = max(articles // 10, 1)
+    engine = create_engine(f"sqlite:///{path}")
+    init_db(engine)
+
+    # spread the articles over three years whatever their number
+    start = datetime(2020, 1, 1)
+    step = timedelta(days=3 * 365) / max(articles, 1)
+    hashed_password = get_password_hash(member_password)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(models.Member),
+            [
+                {
+                    "name": f"member{i}",
+                    "hashed_password": hashed_password,
+                    "role": models.Role.MEMBER,
+                }
+                for i in range(members)
+            ],
+        )
+        connection.execute(
+            insert(models.Category),
+            [{"name": f"category{i}"} for i in range(categories)],
+        )
+        connection.execute(
+            insert(models.Tag), [{"name": f"tag{i}"} for i in range(tags)]
+        )
+
+        batch = 5000
+        for offset in range(0, articles, batch):
+            rows, links, comments = [], [], []
+            for article_id in range(offset + 1, min(offset + batch, articles) + 1):
+                create_time = start + step * article_id
+                rows.append(
+                    {
+                        "id": article_id,
+                        "title": f"article {article_id} {rng.choice(words)}",
+                        # every word above is in nearly every article, the topic
+                        # word is shared by about ten of them
+                        "content": f"{paragraph(rng, content_words)} "
+                        f"topic{article_id % topics:05d}",
+                        "create_time": create_time,
+                        "update_time": create_time + timedelta(days=rng.randint(0, 30)),
+                        "is_deleted": rng.random() < 0.05,
+                        "category_id": rng.randint(1, categories),
+                        "writer_id": rng.randint(1, members + 1),
+                    }
+                )
+                for tag_id in rng.sample(range(1, tags + 1), 3):
+                    links.append({"article_id": article_id, "tag_id": tag_id})
+                for _ in range(comments_per_article):
+                    comments.append(
+                        {
+                            "content": paragraph(rng, 20),
+                            "commenter_name": "visitor",
+                            "like": rng.randint(0, 100),
+                            "dislike": rng.randint(0, 10),
+                            "create_time": create_time
+                            + timedelta(minutes=rng.randint(1, 10000)),
+                            "article_id": article_id,
+                        }
+                    )
+            connection.execute(insert(models.Article), rows)
+            connection.execute(insert(models.article2tag), links)
+            if comments:
+                connection.execute(insert(models.Comment), comments)
+        models.count_articles(connection)
+        models.count_comments(connection)
+        refresh_article_snapshots(Session(connection))
+
+    engine.dispose()
@@ -1,4 +1,7 @@
 import uvicorn
 
 if __name__ == "__main__":
+    from app.cli import main
+
+    main(["init-db"])
     uvicorn.run(app="app.main:app", reload=True)